@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 
+from core.rbac import create_user_claims
 from core.security import create_access_token
 from models.user import authenticate_user
 from schemas.token import Token
@@ -24,6 +25,6 @@ async def login_for_access_token(
             detail="Incorrect username or password",
         )
 
-    access_token = create_access_token(data={"name": user.username})
+    access_token = create_access_token(data=create_user_claims(user))
 
     return {"access_token": access_token, "token_type": "bearer"}
@@ -0,0 +1,159 @@
+import asyncio
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, Response
+
+from core.heap import GroupBy, heap_tracer, structure_sizes
+from core.principal_cache import principal_cache
+from core.profiling import profiler, RequestProfile
+from core.rbac import require_permission
+from core.response_cache import response_cache
+from core.security import token_cache, password_hasher
+from models.widget_stats import stats_cache
+from schemas.user import Permission
+from utils.sanitizer import sanitizer_cache_stats
+
+router = APIRouter(
+    prefix="/diagnostics",
+    tags=["diagnostics"],
+    dependencies=[Depends(require_permission(Permission.VIEW_METRICS))],
+)
+
+
+@router.get("/caches")
+async def read_cache_stats():
+    """Get hit, miss and eviction counters of the in-process caches."""
+    return {
+        "principals": principal_cache.stats(),
+        "tokens": token_cache.stats(),
+        "sanitizer": sanitizer_cache_stats(),
+        "widget_stats": stats_cache.stats(),
+        "responses": response_cache.stats(),
+    }
+
+
+@router.get("/password-hashing")
+async def read_password_hashing_stats():
+    """Get queue depth, rejections and latency of the password hashing pool."""
+    return password_hasher.stats()
+
+
+def get_profile(profile_id: str) -> RequestProfile:
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found, it may have been dropped from the buffer or taken by another worker",
+        )
+    return profile
+
+
+@router.get("/profiles", dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))])
+async def read_profiles():
+    """List the request profiles kept by this worker, newest first."""
+    return {
+        **profiler.stats(),
+        "items": [profile.summary() for profile in reversed(profiler.profiles)],
+    }
+
+
+@router.get(
+    "/profiles/{profile_id}/pstats",
+    response_class=Response,
+    dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))],
+)
+async def download_profile_stats(profile_id: str):
+    """Download the CPU profile of a request, readable with `python -m pstats` or snakeviz."""
+    profile = get_profile(profile_id)
+    return Response(
+        content=profile.pstats_bytes(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile.id}.pstats"'},
+    )
+
+
+@router.get(
+    "/profiles/{profile_id}/collapsed",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))],
+)
+async def download_profile_stacks(profile_id: str):
+    """Download the sampled stacks of a request in collapsed format, the input of flamegraph.pl."""
+    return get_profile(profile_id).collapsed_stacks()
+
+
+@router.get("/heap", dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))])
+async def read_heap():
+    """Get the tracemalloc state, the kept snapshots and the sizes of the in-process caches."""
+    return {
+        **heap_tracer.status(),
+        # Walking large caches takes a while, keep the event loop free meanwhile
+        "structures": await asyncio.to_thread(structure_sizes),
+    }
+
+
+@router.post(
+    "/heap/tracing",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))],
+)
+async def start_heap_tracing(
+        frames: Annotated[int, Query(ge=1, le=64, description="Stack frames stored per allocation")] = 1,
+):
+    """Start tracing allocations with tracemalloc; this slows the worker down until tracing is stopped."""
+    try:
+        heap_tracer.start(frames)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.delete(
+    "/heap/tracing",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))],
+)
+async def stop_heap_tracing():
+    """Stop tracing allocations, keeping the snapshots taken so far."""
+    heap_tracer.stop()
+
+
+@router.put(
+    "/heap/snapshots/{name}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))],
+)
+async def take_heap_snapshot(name: str):
+    """Take a snapshot of the traced allocations under a name, replacing one with the same name."""
+    try:
+        heap_tracer.take_snapshot(name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.delete(
+    "/heap/snapshots/{name}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))],
+)
+async def delete_heap_snapshot(name: str):
+    """Drop a snapshot."""
+    if not heap_tracer.delete_snapshot(name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshot not found")
+
+
+@router.get("/heap/diff", dependencies=[Depends(require_permission(Permission.MANAGE_ROLES))])
+async def read_heap_diff(
+        base: Annotated[str, Query(description="Snapshot to compare against")],
+        target: Annotated[str | None, Query(description="Later snapshot, the heap right now if omitted")] = None,
+        group_by: Annotated[GroupBy, Query(description="Group allocations by file, line or traceback")] = "lineno",
+        limit: Annotated[int, Query(ge=1, le=500, description="Number of entries to return")] = 25,
+):
+    """Get the allocations that grew the most between two snapshots."""
+    try:
+        statistics = heap_tracer.diff(base, target, group_by, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if statistics is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Snapshot not found")
+    return statistics
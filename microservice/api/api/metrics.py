@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from core.metrics import registry
+from core.rbac import require_permission
+from schemas.user import Permission
+
+router = APIRouter(
+    tags=["diagnostics"],
+    dependencies=[Depends(require_permission(Permission.VIEW_METRICS))],
+)
+
+
+class PrometheusResponse(PlainTextResponse):
+    media_type = "text/plain; version=0.0.4"
+
+
+@router.get("/metrics", response_class=PrometheusResponse)
+async def read_metrics():
+    """Get request, MongoDB, rate limiter and password hashing metrics in the Prometheus text format."""
+    return registry.render()
@@ -1,17 +1,25 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Query, HTTPException, status, Depends, Path
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Query, HTTPException, status, Depends, Path, Header, Response
 
 from core.rbac import require_permission, get_current_active_user, has_permission
 from schemas.user import User, UserCreate, Permission, UserUpdate, Role
-from models.user import get_user_by_username, get_user_by_email, create_user, get_all_users, get_user_by_id, \
-    update_user, add_user_permission, update_user_role
+from models.user import create_user, get_all_users, get_user_by_id, update_user, add_user_permission, \
+    update_user_role, get_user_version
+from utils.etag import ETAG_HEADER, VersionConflict, document_etag, etag_matches, if_match_version, not_modified
+from utils.pagination import NEXT_CURSOR_HEADER, next_cursor
+from utils.projection import parse_fields, partial_model
+from utils.responses import ModelResponse
 
 router = APIRouter(
     prefix="/users",
     tags=["users"],
 )
 
+FIELDS_DESCRIPTION = "Comma separated fields to return, e.g. `_id,username,role`. `_id` is always returned."
+
 
 @router.post(
     "/",
@@ -19,19 +27,10 @@ router = APIRouter(
 )
 async def register_user(user: UserCreate):
     """Register a new user."""
-    existing_user = await get_user_by_username(user.username)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Username already exists"
-        )
-
-    existing_email = await get_user_by_email(user.email)
-    if existing_email:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Email already exists."
-        )
-
-    return await create_user(user)
+    try:
+        return await create_user(user)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get(
@@ -42,18 +41,45 @@ async def register_user(user: UserCreate):
 async def read_users(
         skip: Annotated[int, Query(ge=0)] = 0,
         limit: Annotated[int, Query(ge=1, le=100)] = 10,
+        cursor: Annotated[str | None, Query(description="Cursor from the X-Next-Cursor header")] = None,
+        fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
 ):
     """Get all users (requires READ_USER permission)"""
-    return await get_all_users(skip, limit)
+    try:
+        selected = parse_fields(User, fields)
+        users = await get_all_users(skip, limit, after=cursor, fields=selected)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    headers = {}
+    if cursor_value := next_cursor(users, limit):
+        headers[NEXT_CURSOR_HEADER] = cursor_value
+    return ModelResponse(list[partial_model(User, selected)], users, headers=headers)
 
 
 @router.get(
     "/me",
     response_model=User,
 )
-async def read_user_me(current_user: User = Depends(get_current_active_user)):
+async def read_user_me(
+        fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
+        if_none_match: Annotated[str | None, Header()] = None,
+        current_user: User = Depends(get_current_active_user)
+):
     """Get current user information"""
-    return current_user
+    try:
+        selected = parse_fields(User, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    etag = document_etag(current_user.id, current_user.version, selected)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    model = partial_model(User, selected)
+    if model is not User:
+        current_user = model.model_construct(**current_user.__dict__)
+    return ModelResponse(model, current_user, headers={ETAG_HEADER: etag})
 
 
 @router.get(
@@ -61,23 +87,49 @@ async def read_user_me(current_user: User = Depends(get_current_active_user)):
     response_model=User,
     dependencies=[Depends(require_permission(Permission.READ_USER))]
 )
-async def read_user(user_id: str = Path(..., title="The ID of the user to get.")):
+async def read_user(
+        user_id: str = Path(..., title="The ID of the user to get."),
+        fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
+        if_none_match: Annotated[str | None, Header()] = None,
+):
     """Get a specific user by id (requires READ_USER permission)"""
-    user = await get_user_by_id(user_id)
+    try:
+        selected = parse_fields(User, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if if_none_match:
+        # Only the version is read to answer a matching conditional request
+        version = await get_user_version(user_id)
+        if version is not None:
+            # Tag the canonical id, as full responses do, whatever spelling the path used
+            etag = document_etag(str(ObjectId(user_id)), version, selected)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+
+    user = await get_user_by_id(user_id, selected)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    return user
+    headers = {ETAG_HEADER: document_etag(user.id, user.version, selected)}
+    return ModelResponse(partial_model(User, selected), user, headers=headers)
 
 
 @router.patch("/{user_id}", response_model=User)
 async def update_user_details(
         user_update: UserUpdate,
+        response: Response,
         user_id: str = Path(..., title="The ID of the user to update."),
+        if_match: Annotated[str | None, Header(description="Only update the user at this ETag")] = None,
         current_user: User = Depends(get_current_active_user)
 ):
+    try:
+        user_id = str(ObjectId(user_id))
+    except InvalidId:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
     if str(current_user.id) != user_id and not has_permission(current_user, Permission.UPDATE_USER):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -85,12 +137,15 @@ async def update_user_details(
         )
 
     try:
-        updated_user = await update_user(user_id, user_update)
+        updated_user = await update_user(user_id, user_update, if_match_version(if_match, user_id))
         if not updated_user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
             )
+        response.headers[ETAG_HEADER] = document_etag(updated_user.id, updated_user.version)
         return updated_user
+    except VersionConflict as e:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
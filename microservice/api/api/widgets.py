@@ -1,17 +1,36 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Query, Path, HTTPException, status, Depends
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Query, Path, HTTPException, status, Depends, Request, Header, Response
+from fastapi.responses import StreamingResponse
 
-from core.rbac import get_current_active_user, require_permission
-from models.widget import create_widget, get_widget, get_widgets, update_widget, delete_widget, count_widgets
+from core.config import settings
+from core.rbac import get_current_active_user, require_permission, has_permission
+from core.response_cache import CachedResponse, response_cache
+from models.widget import create_widget, get_widget, get_widgets, update_widget, delete_widget, count_widgets, \
+    bulk_write_widgets, iter_widgets, import_widgets, get_widget_version
+from models.widget_counter import get_category_counts
+from models.widget_revision import get_revision
+from models.widget_stats import get_inventory_stats
 from schemas.user import User, Permission
-from schemas.widget import WidgetCreate, Widget, WidgetUpdate
+from schemas.widget import WidgetCreate, Widget, WidgetUpdate, BulkOperation, WidgetBulkRequest, WidgetBulkResponse, \
+    WidgetImportReport, WidgetInventoryStats, WidgetCategoryStats
+from utils.etag import ETAG_HEADER, VersionConflict, collection_etag, document_etag, etag_matches, if_match_version, \
+    not_modified
+from utils.export import csv_chunks, ndjson_chunks
+from utils.importing import csv_rows, ndjson_rows
+from utils.pagination import NEXT_CURSOR_HEADER, next_cursor
+from utils.projection import parse_fields, partial_model, public_fields
+from utils.responses import ModelResponse
 
 router = APIRouter(
     prefix="/widgets",
     tags=["widgets"],
 )
 
+FIELDS_DESCRIPTION = "Comma separated fields to return, e.g. `_id,name,quantity`. `_id` is always returned."
+
 
 @router.post(
     "/",
@@ -26,16 +45,100 @@ async def create_new_widget(
     return await create_widget(widget, str(current_user.id))
 
 
+BULK_PERMISSIONS: dict[BulkOperation, Permission] = {
+    BulkOperation.CREATE: Permission.CREATE_WIDGET,
+    BulkOperation.UPDATE: Permission.UPDATE_WIDGET,
+    BulkOperation.DELETE: Permission.DELETE_WIDGET,
+}
+
+
+@router.post(
+    "/bulk",
+    response_model=WidgetBulkResponse,
+    summary="Create, update and delete widgets in one request.",
+    description=f"Runs up to {settings.WIDGET_BULK_MAX_OPERATIONS} operations as a single bulk write and "
+                "reports the outcome of each one at its index.",
+)
+async def bulk_widgets(
+        bulk: WidgetBulkRequest,
+        current_user: User = Depends(get_current_active_user)
+) -> WidgetBulkResponse:
+    """Run a batch of widget operations."""
+    if len(bulk.operations) > settings.WIDGET_BULK_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.WIDGET_BULK_MAX_OPERATIONS} operations are allowed per request"
+        )
+
+    for op in {item.op for item in bulk.operations}:
+        if not has_permission(current_user, BULK_PERMISSIONS[op]):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Insufficient permissions"
+            )
+
+    return await bulk_write_widgets(str(current_user.id), bulk.operations, bulk.ordered)
+
+
+@router.post(
+    "/import",
+    response_model=WidgetImportReport,
+    summary="Import widgets from an NDJSON or CSV upload.",
+    description="Reads the request body incrementally, validates every row as WidgetCreate and inserts valid rows "
+                "in batches. Invalid rows are reported by row number and do not stop the import.",
+    dependencies=[Depends(require_permission(Permission.CREATE_WIDGET))],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_user_widgets(
+        request: Request,
+        import_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+        current_user: User = Depends(get_current_active_user)
+) -> WidgetImportReport:
+    """Import widgets for the current user."""
+    parse = csv_rows if import_format == "csv" else ndjson_rows
+    rows = parse(request.stream(), settings.WIDGET_IMPORT_MAX_LINE_BYTES)
+
+    return await import_widgets(
+        str(current_user.id),
+        rows,
+        settings.WIDGET_IMPORT_BATCH_SIZE,
+        settings.WIDGET_IMPORT_MAX_ERRORS,
+    )
+
+
 @router.get(
     "/",
     response_model=list[Widget],
     summary="List all widgets for a given user.",
-    description="Retrieve paginated list of widgets for a given user. Optional filtering by category.",
+    description="Retrieve paginated list of widgets for a given user. Optional filtering by category. "
+                "Full pages carry an `X-Next-Cursor` header; pass it as `cursor` to fetch the next page. "
+                "Send the `ETag` back in `If-None-Match` to get 304 while the user's widgets are unchanged.",
     dependencies=[Depends(require_permission(Permission.READ_WIDGET))],
     responses={
         status.HTTP_200_OK: {
             "description": "List of widgets",
-            "model": list[Widget]
+            "model": list[Widget],
+            "headers": {
+                NEXT_CURSOR_HEADER: {
+                    "description": "Cursor of the next page, present when the page is full",
+                    "schema": {"type": "string"},
+                },
+                ETAG_HEADER: {
+                    "description": "Version of this listing",
+                    "schema": {"type": "string"},
+                },
+            }
+        },
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "The listing still matches the `If-None-Match` ETag",
         },
         status.HTTP_401_UNAUTHORIZED: {
             "description": "Unauthorized. Authentication credentials were not provided.",
@@ -53,10 +156,74 @@ async def read_widgets(
         skip: Annotated[int, Query(ge=0, description="Number of rows to skip")] = 0,
         limit: Annotated[int, Query(ge=1, le=100, description="Numbers of records to retrieve")] = 10,
         category: Annotated[str | None, Query(description="Category name")] = None,
+        cursor: Annotated[str | None, Query(description="Cursor of the page to retrieve")] = None,
+        fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
+        if_none_match: Annotated[str | None, Header()] = None,
         current_user: User = Depends(get_current_active_user)
 ):
     """Retrieve widgets with optional filtering."""
-    return await get_widgets(str(current_user.id), skip, limit, category)
+    owner_id = str(current_user.id)
+    params = (skip, limit, category, cursor, fields)
+    # Read the revision before the widgets, so a concurrent write can only make the ETag and cache entry too old
+    revision = await get_revision(owner_id)
+    cache_key = response_cache.key(owner_id, "widgets.list", params)
+    if settings.RESPONSE_CACHE_ENABLED and (cached := response_cache.get(cache_key, revision)):
+        if etag_matches(if_none_match, cached.headers[ETAG_HEADER]):
+            return not_modified(cached.headers[ETAG_HEADER])
+        return Response(cached.body, media_type=ModelResponse.media_type, headers=cached.headers)
+
+    etag = collection_etag(owner_id, revision, repr(params))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    try:
+        selected = parse_fields(Widget, fields)
+        widgets = await get_widgets(owner_id, skip, limit, category, after=cursor, fields=selected)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    headers = {ETAG_HEADER: etag}
+    if cursor_value := next_cursor(widgets, limit):
+        headers[NEXT_CURSOR_HEADER] = cursor_value
+    response = ModelResponse(list[partial_model(Widget, selected)], widgets, headers=headers)
+    if settings.RESPONSE_CACHE_ENABLED:
+        response_cache.set(cache_key, revision, CachedResponse(response.body, headers))
+    return response
+
+
+@router.get(
+    "/export",
+    summary="Export all widgets of the current user.",
+    description="Streams every widget as newline-delimited JSON or CSV straight from the database cursor.",
+    dependencies=[Depends(require_permission(Permission.READ_WIDGET))],
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+        }
+    }
+)
+async def export_widgets(
+        export_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+        category: Annotated[str | None, Query(description="Category name")] = None,
+        current_user: User = Depends(get_current_active_user)
+):
+    """Stream the user`s widgets."""
+    widgets = iter_widgets(str(current_user.id), category, settings.WIDGET_EXPORT_BATCH_SIZE)
+
+    if export_format == "csv":
+        fields = list(public_fields(Widget))
+        content = csv_chunks(widgets, fields, settings.WIDGET_EXPORT_CHUNK_BYTES)
+        media_type = "text/csv"
+    else:
+        content = ndjson_chunks(widgets, settings.WIDGET_EXPORT_CHUNK_BYTES)
+        media_type = "application/x-ndjson"
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="widgets.{export_format}"'},
+    )
 
 
 @router.get(
@@ -71,22 +238,76 @@ async def count_user_widgets(
     return {"count": count}
 
 
+@router.get(
+    "/count/categories",
+    summary="Count the current user's widgets in every category.",
+    dependencies=[Depends(require_permission(Permission.READ_WIDGET))],
+)
+async def count_user_widgets_by_category(current_user: User = Depends(get_current_active_user)):
+    """Count user`s widgets per category"""
+    counts = await get_category_counts(str(current_user.id))
+    return {"total": sum(counts.values()), "categories": counts}
+
+
+@router.get(
+    "/stats",
+    response_model=WidgetInventoryStats,
+    summary="Inventory totals of the current user, overall and per category.",
+    description="Count, total quantity, total value (price * quantity) and min/max/avg price, computed by the "
+                "database. Results are cached until the user's widgets change.",
+    dependencies=[Depends(require_permission(Permission.VIEW_METRICS))],
+)
+async def read_widget_stats(current_user: User = Depends(get_current_active_user)) -> WidgetInventoryStats:
+    """Get inventory totals of the user`s widgets."""
+    return await get_inventory_stats(str(current_user.id))
+
+
+@router.get(
+    "/stats/categories",
+    response_model=list[WidgetCategoryStats],
+    summary="Inventory totals of the current user per category.",
+    dependencies=[Depends(require_permission(Permission.VIEW_METRICS))],
+)
+async def read_widget_category_stats(
+        current_user: User = Depends(get_current_active_user)
+) -> list[WidgetCategoryStats]:
+    """Get inventory totals of the user`s widgets per category."""
+    return (await get_inventory_stats(str(current_user.id))).categories
+
+
 @router.get(
     "/{widget_id}",
     response_model=Widget
 )
 async def read_widget(
         widget_id: str = Path(..., title="The ID of the widget to get."),
+        fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None,
+        if_none_match: Annotated[str | None, Header()] = None,
         current_user: str = "abc"
 ):
     """ Get a specific widget by id. """
-    widget = await get_widget(widget_id, current_user)
+    try:
+        selected = parse_fields(Widget, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if if_none_match:
+        # Only the version is read to answer a matching conditional request
+        version = await get_widget_version(widget_id, current_user)
+        if version is not None:
+            # Tag the canonical id, as full responses do, whatever spelling the path used
+            etag = document_etag(str(ObjectId(widget_id)), version, selected)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+
+    widget = await get_widget(widget_id, current_user, selected)
     if not widget:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Widget not found"
         )
 
-    return widget
+    headers = {ETAG_HEADER: document_etag(widget.id, widget.version, selected)}
+    return ModelResponse(partial_model(Widget, selected), widget, headers=headers)
 
 
 @router.patch(
@@ -95,16 +316,25 @@ async def read_widget(
 )
 async def update_existing_widget(
         widget_update: WidgetUpdate,
+        response: Response,
         widget_id: str = Path(..., title="The ID of the widget to update."),
+        if_match: Annotated[str | None, Header(description="Only update the widget at this ETag")] = None,
         current_user: str = "abc"
 ):
     """ Update a widget"""
-    updated_widget = await update_widget(widget_id, current_user, widget_update)
+    try:
+        version = if_match_version(if_match, widget_id)
+        updated_widget = await update_widget(widget_id, current_user, widget_update, version)
+    except VersionConflict as e:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=str(e))
+    except InvalidId:
+        updated_widget = None
     if not updated_widget:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Widget not found"
         )
 
+    response.headers[ETAG_HEADER] = document_etag(updated_widget.id, updated_widget.version)
     return updated_widget
 
 
@@ -114,10 +344,16 @@ async def update_existing_widget(
 )
 async def delete_existing_widget(
         widget_id: str = Path(..., title="The ID of the widget to delete."),
+        if_match: Annotated[str | None, Header(description="Only delete the widget at this ETag")] = None,
         current_user: str = "abc"
 ):
     """Delete a widget"""
-    deleted = await delete_widget(widget_id, current_user)
+    try:
+        deleted = await delete_widget(widget_id, current_user, if_match_version(if_match, widget_id))
+    except VersionConflict as e:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=str(e))
+    except InvalidId:
+        deleted = False
     if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Widget not found"
@@ -0,0 +1,224 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheEntry(Generic[V]):
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value: V, expires_at: float) -> None:
+        self.value = value
+        self.expires_at = expires_at
+
+
+class TTLCache(Generic[K, V]):
+    """Size-bounded LRU cache whose entries expire after a TTL.
+
+    Expired entries are dropped lazily on lookup and ahead of LRU eviction.
+    """
+
+    def __init__(
+            self,
+            max_size: int,
+            ttl: float,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[K, CacheEntry[V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def get(self, key: K, is_valid: Callable[[V], bool] | None = None) -> V | None:
+        """Get a value, treating it as a miss if it expired or fails `is_valid`."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= self.clock() or (is_valid is not None and not is_valid(entry.value)):
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: K, value: V, expires_at: float | None = None) -> None:
+        """Store a value until `expires_at` on the cache clock, or for the TTL."""
+        now = self.clock()
+        if expires_at is None or expires_at > now + self.ttl:
+            expires_at = now + self.ttl
+
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self.max_size:
+            oldest_key, oldest = next(iter(entries.items()))
+            del entries[oldest_key]
+            if oldest.expires_at > now:
+                self.evictions += 1
+
+        entries[key] = CacheEntry(value, expires_at)
+
+    def pop(self, key: K) -> V | None:
+        entry = self._entries.pop(key, None)
+        return entry.value if entry is not None else None
+
+    def values(self) -> list[V]:
+        return [entry.value for entry in self._entries.values()]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SharedTableMismatch(RuntimeError):
+    """Raised when a shared table file exists with another size or header than configured."""
+
+
+def open_shared_table(path: str, size: int, header: bytes = b"") -> tuple[int, mmap.mmap]:
+    """Open and map a table file shared by all workers on a host.
+
+    A new or empty file is sized and stamped with `header`. An existing file
+    must already match both: resizing or resetting it would pull the table
+    from under workers that still map it, so a mismatch refuses to start.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            current_size = os.fstat(fd).st_size
+            if current_size == 0:
+                os.ftruncate(fd, size)
+                os.pwrite(fd, header, 0)
+            elif current_size != size or os.pread(fd, len(header), 0) != header:
+                raise SharedTableMismatch(
+                    f"{path} holds a table of another size or layout than configured; "
+                    f"stop the workers using it and remove the file"
+                )
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        return fd, mmap.mmap(fd, size)
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+class LocalGenerations:
+    """Per-key generation counters of a single worker, with the interface of SharedGenerations.
+
+    Keys hash into a fixed number of slots, so memory stays bounded however
+    many keys are bumped; a collision only causes a spurious miss.
+    """
+
+    def __init__(self, slots: int) -> None:
+        self.slots = slots
+        self._counters = array("Q", bytes(8 * slots))
+
+    def _slot(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % self.slots
+
+    def get(self, key: str) -> int:
+        return self._counters[self._slot(key)]
+
+    def bump(self, key: str) -> None:
+        slot = self._slot(key)
+        self._counters[slot] = (self._counters[slot] + 1) & 0xFFFFFFFFFFFFFFFF
+
+    def close(self) -> None:
+        pass
+
+
+class SharedGenerations:
+    """Per-key generation stamps in an mmap'd file shared by all workers on a host.
+
+    Keys hash into a fixed number of 8-byte slots. Bumping a key writes a
+    fresh random stamp, so a concurrent bump can never restore a stamp that a
+    reader already captured; a collision only causes a spurious miss.
+    """
+
+    SLOT_SIZE = 8
+
+    def __init__(self, path: str, slots: int) -> None:
+        self.path = path
+        self.slots = slots
+
+        self._fd, self._map = open_shared_table(path, slots * self.SLOT_SIZE)
+
+    def _offset(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % self.slots * self.SLOT_SIZE
+
+    def get(self, key: str) -> bytes:
+        offset = self._offset(key)
+        return self._map[offset:offset + self.SLOT_SIZE]
+
+    def bump(self, key: str) -> None:
+        offset = self._offset(key)
+        self._map[offset:offset + self.SLOT_SIZE] = os.urandom(self.SLOT_SIZE)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class SharedMaxima:
+    """Per-key integer high-water marks in an mmap'd file shared by all workers on a host.
+
+    Keys hash into a fixed number of slots, so a collision can only
+    overstate the value of a key, never understate it.
+    """
+
+    SLOT = struct.Struct("<Q")
+
+    def __init__(self, path: str, slots: int) -> None:
+        self.path = path
+        self.slots = slots
+
+        self._fd, self._map = open_shared_table(path, slots * self.SLOT.size)
+
+    def _offset(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % self.slots * self.SLOT.size
+
+    def get(self, key: str) -> int:
+        return self.SLOT.unpack_from(self._map, self._offset(key))[0]
+
+    def raise_to(self, key: str, value: int) -> None:
+        """Raise the value of a key to at least `value`."""
+        offset = self._offset(key)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.SLOT.size, offset)
+        try:
+            if self.SLOT.unpack_from(self._map, offset)[0] < value:
+                self.SLOT.pack_into(self._map, offset, value)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.SLOT.size, offset)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
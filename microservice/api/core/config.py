@@ -1,4 +1,5 @@
 import os
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 from pydantic import Field
@@ -12,19 +13,89 @@ class Settings(BaseSettings):
 
     MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
     MONGO_DB_NAME: str = os.getenv("MONGO_DB_NAME", "widget_db")
+    # Explain hot model queries and fail on collection scans (development and tests only)
+    QUERY_GUARD_ENABLED: bool = Field(default=False)
 
     SECRET_KEY: str = os.getenv("SECRET_KEY", "secret")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 14
+    # Embed role and permission mask in tokens so guarded routes authorize without a user lookup
+    STATELESS_AUTH: bool = Field(default=False)
+
+    PASSWORD_HASH_WORKERS: int = Field(default=4)
+    PASSWORD_HASH_QUEUE_SIZE: int = Field(default=32)
+
+    TOKEN_CACHE_ENABLED: bool = Field(default=True)
+    TOKEN_CACHE_MAX_SIZE: int = Field(default=10_000)
 
     CORS_ALLOW_CREDENTIALS: bool = True
     CORS_ALLOW_METHODS: list[str] = ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
     CORS_ALLOW_HEADERS: list[str] = ["*"]
     CORS_MAX_AGE: int = 600
 
+    WIDGET_BULK_MAX_OPERATIONS: int = Field(default=1000)
+    WIDGET_EXPORT_BATCH_SIZE: int = Field(default=1000)
+    WIDGET_EXPORT_CHUNK_BYTES: int = Field(default=64 * 1024)
+    WIDGET_IMPORT_BATCH_SIZE: int = Field(default=1000)
+    WIDGET_IMPORT_MAX_LINE_BYTES: int = Field(default=64 * 1024)
+    WIDGET_IMPORT_MAX_ERRORS: int = Field(default=1000)
+    # Rebuild widget counters from the widgets this often, 0 to only run scripts.reconcile_widget_counters
+    WIDGET_COUNTER_RECONCILE_SECONDS: int = Field(default=0)
+
+    # Memoized sanitizer results; longer strings are sanitized without caching
+    SANITIZER_CACHE_SIZE: int = Field(default=4096)
+    SANITIZER_CACHE_MAX_LENGTH: int = Field(default=256)
+
     RATE_LIMIT_ANON_REQUESTS: int = Field(default=30)
     RATE_LIMIT_AUTH_REQUESTS: int = Field(default=100)
     RATE_LIMIT_WINDOW_SECONDS: int = Field(default=60)
+    RATE_LIMIT_MAX_KEYS: int = Field(default=100_000)
+    RATE_LIMIT_BACKEND: Literal["memory", "shared_memory", "network"] = Field(default="memory")
+    RATE_LIMIT_SHM_PATH: str = Field(default="/dev/shm/widget-api-rate-limit")
+    RATE_LIMIT_SHM_SLOTS: int = Field(default=65_536)
+    RATE_LIMIT_SHM_STRIPES: int = Field(default=64)
+    RATE_LIMIT_STORE_HOST: str = Field(default="127.0.0.1")
+    RATE_LIMIT_STORE_PORT: int = Field(default=6390)
+    RATE_LIMIT_STORE_FLUSH_SECONDS: float = Field(default=0.05)
+
+    PRINCIPAL_CACHE_TTL_SECONDS: int = Field(default=30)
+    PRINCIPAL_CACHE_MAX_SIZE: int = Field(default=10_000)
+    PRINCIPAL_CACHE_INVALIDATION: Literal["local", "shared_memory"] = Field(default="local")
+    PRINCIPAL_CACHE_SHM_PATH: str = Field(default="/dev/shm/widget-api-principals")
+    PRINCIPAL_CACHE_SHM_SLOTS: int = Field(default=65_536)
+    PERMISSION_VERSIONS_SHM_PATH: str = Field(default="/dev/shm/widget-api-permission-versions")
+    # Stateless tokens are checked against the stored permissions version and status, cached this long
+    PERMISSION_STATE_CACHE_TTL_SECONDS: float = Field(default=5)
+
+    # Inventory stats per owner, checked against the stored revision of the owner's widgets
+    WIDGET_STATS_CACHE_TTL_SECONDS: int = Field(default=300)
+    WIDGET_STATS_CACHE_MAX_SIZE: int = Field(default=10_000)
+    # Serialized widget list responses, checked against the stored revision of the owner's widgets
+    RESPONSE_CACHE_ENABLED: bool = Field(default=True)
+    RESPONSE_CACHE_BACKEND: Literal["memory", "shared_memory"] = Field(default="memory")
+    RESPONSE_CACHE_MAX_BYTES: int = Field(default=64 * 1024 * 1024)
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = Field(default=1024 * 1024)
+    RESPONSE_CACHE_SHM_PATH: str = Field(default="/dev/shm/widget-api-responses")
+    RESPONSE_CACHE_SHM_SLOTS: int = Field(default=2048)
+    RESPONSE_CACHE_SHM_SLOT_BYTES: int = Field(default=32 * 1024)
+
+    # Per-request CPU profiles, triggered by admins with X-Profile: 1 or ?profile=1, or sampled at random
+    PROFILING_ENABLED: bool = Field(default=False)
+    PROFILING_SAMPLE_RATE: float = Field(default=0.0)
+    PROFILING_BUFFER_SIZE: int = Field(default=50)
+    PROFILING_STACK_INTERVAL_SECONDS: float = Field(default=0.002)
+
+    # tracemalloc snapshots kept for /diagnostics/heap, oldest dropped first
+    HEAP_SNAPSHOTS_MAX: int = Field(default=5)
+
+    # (Host substring, environment, debug), first match wins
+    ENV_HOST_RULES: list[tuple[str, str, bool]] = Field(default=[
+        ("dev", "dev", True),
+        ("uat", "uat", True),
+        ("cert", "cert", False),
+    ])
+    DEFAULT_ENV: str = Field(default="prod")
+    DEFAULT_DEBUG: bool = Field(default=False)
 
     SSL_KEYFILE: str = os.getenv("SSL_KEYFILE")
     SSL_CERTFILE: str = os.getenv("SSL_CERTFILE")
@@ -0,0 +1,46 @@
+from contextvars import ContextVar, Token
+from functools import lru_cache
+from typing import NamedTuple
+
+from core.config import settings
+
+
+class RequestEnvironment(NamedTuple):
+    """Environment a request was addressed to, resolved from its Host header."""
+    env: str
+    debug: bool
+
+
+# Host substring rules in priority order, compiled once at import time
+HOST_RULES: tuple[tuple[str, RequestEnvironment], ...] = tuple(
+    (pattern, RequestEnvironment(env, debug)) for pattern, env, debug in settings.ENV_HOST_RULES
+)
+DEFAULT_ENVIRONMENT = RequestEnvironment(settings.DEFAULT_ENV, settings.DEFAULT_DEBUG)
+
+_request_environment: ContextVar[RequestEnvironment] = ContextVar(
+    "request_environment", default=DEFAULT_ENVIRONMENT
+)
+
+
+@lru_cache(maxsize=1024)
+def resolve_environment(host: str) -> RequestEnvironment:
+    """Resolve the environment for a Host header."""
+    for pattern, environment in HOST_RULES:
+        if pattern in host:
+            return environment
+    return DEFAULT_ENVIRONMENT
+
+
+def get_request_environment() -> RequestEnvironment:
+    """Get the environment of the request being handled."""
+    return _request_environment.get()
+
+
+def set_request_environment(environment: RequestEnvironment) -> Token[RequestEnvironment]:
+    """Set the environment of the request being handled and return a reset token."""
+    return _request_environment.set(environment)
+
+
+def reset_request_environment(token: Token[RequestEnvironment]) -> None:
+    _request_environment.reset(token)
+
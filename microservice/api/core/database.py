@@ -1,9 +1,12 @@
 from pymongo import AsyncMongoClient
 
 from core.config import settings
+from core.metrics import CommandMetrics
 
-client = AsyncMongoClient(settings.MONGO_URI)
+client = AsyncMongoClient(settings.MONGO_URI, event_listeners=[CommandMetrics()])
 db = client[settings.MONGO_DB_NAME]
 
 users_collection = db.users
-widgets_collection = db.widgets
\ No newline at end of file
+widgets_collection = db.widgets
+widget_counters_collection = db.widget_counters
+widget_revisions_collection = db.widget_revisions
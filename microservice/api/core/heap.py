@@ -0,0 +1,133 @@
+import gc
+import sys
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime, timezone
+from types import BuiltinFunctionType, CodeType, FrameType, FunctionType, MethodType, ModuleType
+from typing import Callable, Literal
+
+from core.config import settings
+
+# Referents that belong to the program rather than to a data structure
+_SHARED_TYPES = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType, CodeType, FrameType)
+# Allocations of tracemalloc and the import system are noise in the diffs
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+GroupBy = Literal["filename", "lineno", "traceback"]
+
+
+def deep_size(obj: object) -> int:
+    """Estimate the bytes held by an object and everything it references.
+
+    Types, modules, functions and code are shared with the rest of the
+    program and are not counted. Objects such as interned strings that are
+    also referenced from elsewhere are, so the estimate errs on the high side.
+    """
+    seen = set()
+    pending = [obj]
+    size = 0
+    while pending:
+        item = pending.pop()
+        if id(item) in seen or isinstance(item, _SHARED_TYPES):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        pending.extend(gc.get_referents(item))
+    return size
+
+
+# In-process structures whose size is reported, registered by the modules that own them
+_structures: dict[str, tuple[object, Callable[[], int]]] = {}
+
+
+def register_structure(name: str, obj: object, entries: Callable[[], int] | None = None) -> None:
+    """Report the size of a long-lived structure; `entries` defaults to its length."""
+    _structures[name] = (obj, entries or obj.__len__)
+
+
+def structure_sizes() -> dict[str, dict[str, int]]:
+    """Get the number of entries and estimated bytes of every registered structure."""
+    return {
+        name: {"entries": entries(), "bytes": deep_size(obj)}
+        for name, (obj, entries) in list(_structures.items())
+    }
+
+
+class HeapTracer:
+    """Start and stop tracemalloc and keep a few named snapshots to diff.
+
+    tracemalloc is off unless started here or with PYTHONTRACEMALLOC, so
+    there is no cost while it is not in use. The oldest snapshot is dropped
+    once HEAP_SNAPSHOTS_MAX are kept.
+    """
+
+    def __init__(self, max_snapshots: int) -> None:
+        self.max_snapshots = max_snapshots
+        self.snapshots: OrderedDict[str, tuple[datetime, tracemalloc.Snapshot]] = OrderedDict()
+
+    def start(self, frames: int) -> None:
+        if tracemalloc.is_tracing():
+            raise ValueError("Allocations are already being traced, stop tracing first")
+        tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        """Stop tracing; snapshots taken so far are kept."""
+        tracemalloc.stop()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise ValueError("Allocations are not being traced, start tracing first")
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def take_snapshot(self, name: str) -> None:
+        snapshot = self._take()
+        self.snapshots.pop(name, None)
+        while len(self.snapshots) >= self.max_snapshots:
+            self.snapshots.popitem(last=False)
+        self.snapshots[name] = (datetime.now(timezone.utc), snapshot)
+
+    def delete_snapshot(self, name: str) -> bool:
+        return self.snapshots.pop(name, None) is not None
+
+    def diff(self, base: str, target: str | None, group_by: GroupBy, limit: int) -> list[dict] | None:
+        """Compare two snapshots, or one against the heap right now, largest growth first.
+
+        Returns None when one of the named snapshots does not exist.
+        """
+        if base not in self.snapshots or (target is not None and target not in self.snapshots):
+            return None
+
+        current = self.snapshots[target][1] if target is not None else self._take()
+        statistics = current.compare_to(self.snapshots[base][1], group_by, cumulative=group_by == "traceback")
+        return [
+            {
+                "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in statistics[:limit]
+        ]
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "snapshots": [
+                {"name": name, "taken_at": taken_at, "traces": len(snapshot.traces)}
+                for name, (taken_at, snapshot) in self.snapshots.items()
+            ],
+        }
+
+
+heap_tracer = HeapTracer(settings.HEAP_SNAPSHOTS_MAX)
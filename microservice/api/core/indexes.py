@@ -0,0 +1,166 @@
+import logging
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import OperationFailure
+
+from core.config import settings
+from core.database import db
+from core.heap import register_structure
+
+logger = logging.getLogger(__name__)
+
+# Indexes every collection is expected to have, by collection name
+INDEXES: dict[str, list[IndexModel]] = {
+    "widgets": [
+        # Listing by owner in _id order (cursor pagination)
+        IndexModel([("owner", ASCENDING), ("_id", ASCENDING)], name="owner_id"),
+        # Listing and counting by owner and category
+        IndexModel([("owner", ASCENDING), ("category", ASCENDING), ("_id", ASCENDING)], name="owner_category_id"),
+    ],
+    "widget_counters": [
+        # Point lookups by owner and category, and all counters of an owner
+        IndexModel([("owner", ASCENDING), ("category", ASCENDING)], name="owner_category_unique", unique=True),
+    ],
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+}
+
+# Index options that make two indexes with the same keys behave differently
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _index_signature(document: dict) -> tuple:
+    return (
+        tuple(document["key"].items()),
+        tuple((option, document.get(option)) for option in COMPARED_OPTIONS if document.get(option)),
+    )
+
+
+async def reconcile_collection(collection: AsyncCollection, indexes: list[IndexModel]) -> dict[str, list[str]]:
+    """Create missing indexes of a collection and report ones that drifted from the declaration.
+
+    An index with the declared keys and options under another name is not
+    recreated; it is reported as drifted. Declared indexes whose keys and
+    options are not in place, because they differ or could not be created,
+    are listed under "missing".
+    """
+    existing = {index["name"]: index async for index in await collection.list_indexes()}
+    report = {"created": [], "drifted": [], "unexpected": [], "failed": [], "missing": []}
+
+    for index in indexes:
+        declared = index.document
+        name = declared["name"]
+        signature = _index_signature(declared)
+        current = existing.pop(name, None)
+
+        if current is None:
+            equivalent = next(
+                (other for other, document in existing.items() if _index_signature(document) == signature), None,
+            )
+            if equivalent is not None:
+                del existing[equivalent]
+                report["drifted"].append(f"{name} (exists as {equivalent})")
+                continue
+            try:
+                await collection.create_indexes([index])
+                report["created"].append(name)
+            except OperationFailure as e:
+                logger.error("Could not create index %s.%s: %s", collection.name, name, e)
+                report["failed"].append(name)
+                report["missing"].append(name)
+        elif _index_signature(current) != signature:
+            report["drifted"].append(name)
+            report["missing"].append(name)
+
+    report["unexpected"] = [name for name in existing if name != "_id_"]
+    return report
+
+
+class MissingIndexError(RuntimeError):
+    """Raised on startup when a declared unique index is not in place with its keys and options."""
+
+
+async def reconcile_indexes() -> dict[str, dict[str, list[str]]]:
+    """Bring the database indexes in line with INDEXES and log what changed or drifted.
+
+    Writes rely on the unique indexes to reject duplicates, so a unique index
+    whose keys and options are not in place raises MissingIndexError once all
+    collections are reconciled.
+    """
+    reports = {}
+    missing = []
+    for collection_name, indexes in INDEXES.items():
+        report = await reconcile_collection(db[collection_name], indexes)
+        reports[collection_name] = report
+
+        for name in report["created"]:
+            logger.info("Created index %s.%s", collection_name, name)
+        for name in report["drifted"]:
+            logger.warning("Index %s.%s differs from its declaration", collection_name, name)
+        for name in report["unexpected"]:
+            logger.warning("Index %s.%s is not declared", collection_name, name)
+
+        missing.extend(
+            f"{collection_name}.{index.document['name']}" for index in indexes
+            if index.document.get("unique") and index.document["name"] in report["missing"]
+        )
+
+    if missing:
+        raise MissingIndexError(f"Unique indexes are not in place: {', '.join(missing)}")
+    return reports
+
+
+class UnindexedQueryError(RuntimeError):
+    """Raised by the query guard when a query would scan a whole collection."""
+
+
+_checked_shapes: set[tuple] = set()
+register_structure("query_shapes", _checked_shapes)
+
+
+def _query_shape(value):
+    """Reduce a filter or sort to its structure so explain runs once per shape."""
+    if isinstance(value, dict):
+        return tuple((key, _query_shape(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_query_shape(item) for item in value)
+    return None
+
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            yield from _plan_stages(plan[child])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def check_query_plan(
+        collection: AsyncCollection,
+        query: dict,
+        sort: list[tuple[str, int]] | None = None,
+        command: str = "find",
+) -> None:
+    """Fail if a query would fall back to a collection scan.
+
+    Only active with QUERY_GUARD_ENABLED, meant for development and tests.
+    """
+    if not settings.QUERY_GUARD_ENABLED:
+        return
+
+    shape = (collection.name, command, _query_shape(query), _query_shape(sort))
+    if shape in _checked_shapes:
+        return
+
+    explained = {command: collection.name, ("filter" if command == "find" else "query"): query}
+    if sort:
+        explained["sort"] = dict(sort)
+    explanation = await collection.database.command("explain", explained, verbosity="queryPlanner")
+
+    if "COLLSCAN" in _plan_stages(explanation["queryPlanner"]["winningPlan"]):
+        raise UnindexedQueryError(f"{command} on {collection.name} with {query} scans the whole collection")
+    _checked_shapes.add(shape)
@@ -0,0 +1,264 @@
+import math
+from bisect import bisect_left
+from typing import Callable, Iterable, TypeVar
+
+from pymongo import monitoring
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bcrypt takes hundreds of milliseconds, so its buckets start higher
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+
+F = TypeVar("F", bound="MetricFamily")
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: int = 1) -> None:
+        self.value -= amount
+
+
+class Histogram:
+    """Observation counts in fixed buckets, allocated once and only incremented afterwards."""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # The last bucket collects everything above the highest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class MetricFamily:
+    """A named metric with one child per combination of label values.
+
+    Children are created the first time a combination is seen and reused
+    from then on, so recording a value does not allocate. Updates are plain
+    attribute increments; the event loop runs them one at a time, so no
+    locks are needed.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], Counter | Gauge | Histogram] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self) -> Iterable[str]:
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class CounterFamily(MetricFamily):
+    kind = "counter"
+
+    def _new_child(self) -> Counter:
+        return Counter()
+
+
+class GaugeFamily(MetricFamily):
+    kind = "gauge"
+
+    def _new_child(self) -> Gauge:
+        return Gauge()
+
+
+class HistogramFamily(MetricFamily):
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def _new_child(self) -> Histogram:
+        return Histogram(self.buckets)
+
+    def samples(self) -> Iterable[str]:
+        labelnames = (*self.labelnames, "le")
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*child.bounds, math.inf), child.counts):
+                cumulative += count
+                labels = _format_labels(labelnames, (*values, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackGaugeFamily(MetricFamily):
+    """A gauge read from its source when metrics are collected instead of being updated along the way."""
+    kind = "gauge"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+            collect: Callable[[], Iterable[tuple[tuple[str, ...], float]]] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        if self.collect is None:
+            return
+        for values, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.families: dict[str, MetricFamily] = {}
+
+    def register(self, family: F) -> F:
+        if family.name in self.families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self.families[family.name] = family
+        return family
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        return "\n".join(family.render() for family in self.families.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(HistogramFamily(
+    "http_request_duration_seconds",
+    "Time to send a full response, by route template and method.",
+    ("method", "route"),
+))
+http_responses = registry.register(CounterFamily(
+    "http_responses_total",
+    "Responses sent, by route template, method and status code.",
+    ("method", "route", "status"),
+))
+http_requests_in_flight = registry.register(GaugeFamily(
+    "http_requests_in_flight",
+    "Requests being handled right now.",
+)).labels()
+
+mongo_command_duration = registry.register(HistogramFamily(
+    "mongo_command_duration_seconds",
+    "Server round trip of MongoDB commands, by collection and command.",
+    ("collection", "command"),
+))
+mongo_command_failures = registry.register(CounterFamily(
+    "mongo_command_failures_total",
+    "MongoDB commands that failed, by collection and command.",
+    ("collection", "command"),
+))
+
+rate_limit_rejections = registry.register(CounterFamily(
+    "rate_limit_rejections_total",
+    "Requests rejected with 429, by the kind of key that hit its limit.",
+    ("key",),
+))
+rate_limit_keys = registry.register(CallbackGaugeFamily(
+    "rate_limit_keys",
+    "Keys tracked by the rate limiter, by kind.",
+    ("key",),
+))
+
+password_hash_duration = registry.register(HistogramFamily(
+    "password_hash_duration_seconds",
+    "Time spent in bcrypt per hash or verification, excluding the wait for a worker.",
+    buckets=HASH_BUCKETS,
+)).labels()
+password_hashing = registry.register(CallbackGaugeFamily(
+    "password_hashing",
+    "State of the password hashing pool: in_flight, queue_depth and rejections.",
+    ("state",),
+))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Record the latency of every MongoDB command by collection and command name.
+
+    Succeeded and failed events do not carry the command itself, so the
+    collection is remembered from the started event until the command ends.
+    """
+
+    def __init__(self) -> None:
+        self._collections: dict[tuple, str] = {}
+
+    @staticmethod
+    def _key(event) -> tuple:
+        return event.connection_id, event.request_id
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[self._key(event)] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        collection = self._collections.pop(self._key(event), "")
+        mongo_command_duration.labels(collection, event.command_name).observe(event.duration_micros / 1_000_000)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._collections.pop(self._key(event), "")
+        mongo_command_duration.labels(collection, event.command_name).observe(event.duration_micros / 1_000_000)
+        mongo_command_failures.labels(collection, event.command_name).inc()
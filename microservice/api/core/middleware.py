@@ -1,147 +1,202 @@
-import os
-from datetime import datetime, timezone, timedelta
-from typing import Any, Callable
+import random
+import sys
+import time
+from urllib.parse import parse_qs
 
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Request, Response, status
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import FastAPI, Response, status
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from core.config import settings
-
-
-class RateLimiter:
-    def __init__(self):
-        self.ip_cache: dict[str, list[datetime]] = {}
-        self.token_cache: dict[str, list[datetime]] = {}
-        self.cleanup_counter = 0
-
-    @staticmethod
-    def _cleanup_old_requests(cache: dict[str, list[datetime]]) -> None:
-        now = datetime.now(timezone.utc)
-        window_time = now - timedelta(seconds=settings.RATE_LIMIT_WINDOW_SECONDS)
-
-        for key in cache.keys():
-            cache[key] = [ts for ts in cache[key] if ts > window_time]
-
-            if not cache[key]:
-                del cache[key]
-
-    def is_rate_limited(self, ip: str, token: str | None = None) -> tuple[bool, dict[str, Any]]:
-        now = datetime.now(timezone.utc)
-
-        self.cleanup_counter += 1
-
-        if self.cleanup_counter > 100:
-            self._cleanup_old_requests(self.ip_cache)
-            self._cleanup_old_requests(self.token_cache)
-            self.cleanup_counter = 0
-
-        # IP-based rate limiting
-        ip_requests = self.ip_cache.get(ip, [])
-        window_time = now - timedelta(seconds=settings.RATE_LIMIT_WINDOW_SECONDS)
-        ip_requests = [ts for ts in ip_requests if ts > window_time]
-
-        # Token-based rate limiting
-        token_requests = []
-        if token:
-            token_requests = self.token_cache.get(token, [])
-            token_requests = [ts for ts in token_requests if ts > window_time]
-
-        if token and len(token_requests) >= settings.RATE_LIMIT_AUTH_REQUESTS:
-            remaining = 0
-            limit = settings.RATE_LIMIT_AUTH_REQUESTS
-            is_limited = True
-        elif not token and len(ip_requests) >= settings.RATE_LIMIT_ANON_REQUESTS:
-            remaining = 0
-            limit = settings.RATE_LIMIT_ANON_REQUESTS
-            is_limited = True
-        else:
-            if token:
-                remaining = settings.RATE_LIMIT_AUTH_REQUESTS - len(token_requests)
-                limit = settings.RATE_LIMIT_AUTH_REQUESTS
-            else:
-                remaining = settings.RATE_LIMIT_ANON_REQUESTS - len(ip_requests)
-                limit = settings.RATE_LIMIT_ANON_REQUESTS
-
-            if token:
-                if token not in self.token_cache:
-                    self.token_cache[token] = []
-                self.token_cache[token].append(now)
-
-            if ip not in self.ip_cache:
-                self.ip_cache[ip] = []
-            self.ip_cache[ip].append(now)
-
-            is_limited = False
-
-        headers = {
-            "X-RateLimit-Limit": str(limit),
-            "X-RateLimit-Remaining": str(max(0, remaining)),
-            "X-RateLimit-Reset": str(
-                int((window_time + timedelta(seconds=settings.RATE_LIMIT_WINDOW_SECONDS)).timestamp()))
-        }
-
-        return is_limited, headers
-
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: FastAPI) -> None:
-        super().__init__(app)
+from core.context import resolve_environment, set_request_environment, reset_request_environment
+from core.heap import register_structure
+from core.metrics import http_request_duration, http_responses, http_requests_in_flight, rate_limit_keys, \
+    rate_limit_rejections
+from core.profiling import profiler
+from core.rate_limit import RateLimiter
+from core.rbac import token_has_permission
+from schemas.user import Permission
+
+# Route label of requests that did not reach a route: 404s, rate limited and preflight requests
+UNMATCHED_ROUTE = "unmatched"
+# Method labels; clients can send any method, so the others are recorded as OTHER_METHOD
+KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+OTHER_METHOD = "other"
+
+
+def get_header(scope: Scope, name: bytes) -> str | None:
+    """Get a raw request header from an ASGI scope."""
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
         self.limiter = RateLimiter()
-
-    async def dispatch(self, request: Request, call_next: Callable):
-
-        ip = request.client.host
+        self.ip_rejections = rate_limit_rejections.labels("ip")
+        self.token_rejections = rate_limit_rejections.labels("token")
+        register_structure("rate_limit_ips", self.limiter.ip_cache)
+        register_structure("rate_limit_tokens", self.limiter.token_cache)
+        rate_limit_keys.collect = lambda: (
+            (("ip",), len(self.limiter.ip_cache)),
+            (("token",), len(self.limiter.token_cache)),
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ip = scope["client"][0] if scope.get("client") else ""
 
         token = None
-        auth_header = request.headers.get("Authorization")
+        auth_header = get_header(scope, b"authorization")
         if auth_header and auth_header.startswith("Bearer "):
             token = auth_header[7:]
 
         is_limited, headers = self.limiter.is_rate_limited(ip, token)
 
         if is_limited:
-            return Response(
+            (self.token_rejections if token else self.ip_rejections).inc()
+            response = Response(
                 content='{"detail": "Too many requests"}',
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 media_type="application/json",
                 headers=headers
             )
-
-        response = await call_next(request)
-
-        for key, value in headers.items():
-            response.headers[key] = value
-
-        return response
-
-
-class EnvMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable):
-        host = request.headers.get("host", "")
-
-        if "dev" in host:
-            env = "dev"
-            debug = True
-        elif "uat" in host:
-            env = "uat"
-            debug = True
-        elif "cert" in host:
-            env = "cert"
-            debug = False
-        else:
-            env = "prod"
-            debug = False
-
-        os.environ["ENV"] = env
-        os.environ["DEBUG"] = str(debug)
-
-        return await call_next(request)
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_headers = MutableHeaders(scope=message)
+                for key, value in headers.items():
+                    response_headers[key] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class MetricsMiddleware:
+    """Record latency and status of every response by route template, and the number of requests in flight."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self._routes: dict | None = None
+
+    def _route(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if self._routes is None:
+            # Routing leaves the endpoint in the scope; label by its path template, not the raw path
+            self._routes = {route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")}
+        return self._routes.get(endpoint, UNMATCHED_ROUTE)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            route = self._route(scope)
+            method = scope["method"] if scope["method"] in KNOWN_METHODS else OTHER_METHOD
+            http_request_duration.labels(method, route).observe(elapsed)
+            http_responses.labels(method, route, status_code).inc()
+
+
+class ProfilingMiddleware:
+    """Profile requests sampled at PROFILING_SAMPLE_RATE, or asked for by an admin.
+
+    Admins ask with an `X-Profile: 1` header or a `profile=1` query
+    parameter; the id of the stored profile is returned in `X-Profile-Id`.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def _trigger(self, scope: Scope) -> str | None:
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return "sampled"
+
+        requested = get_header(scope, b"x-profile") == "1"
+        if not requested and b"profile=" in scope["query_string"]:
+            requested = parse_qs(scope["query_string"].decode("latin-1")).get("profile") == ["1"]
+        if not requested:
+            return None
+
+        auth_header = get_header(scope, b"authorization")
+        if auth_header and auth_header.startswith("Bearer ") and \
+                await token_has_permission(auth_header[7:], Permission.MANAGE_ROLES):
+            return "requested"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trigger = await self._trigger(scope)
+        profile = trigger and profiler.start(scope["method"], scope["path"], trigger, sys._getframe())
+        if not profile:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile.id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop(profile, status_code)
+
+
+class EnvMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = set_request_environment(resolve_environment(get_header(scope, b"host") or ""))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_request_environment(token)
 
 
 def add_middleware(app: FastAPI) -> None:
     app.add_middleware(EnvMiddleware)
 
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(ProfilingMiddleware)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.CORS_ALLOW_ORIGINS,
@@ -152,3 +207,5 @@ def add_middleware(app: FastAPI) -> None:
     )
 
     app.add_middleware(RateLimitMiddleware)
+
+    app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,73 @@
+from core.cache import LocalGenerations, SharedGenerations, TTLCache
+from core.config import settings
+from core.heap import register_structure
+from schemas.user import User
+
+
+class PrincipalCache:
+    """Cache of authenticated users keyed by username.
+
+    Model functions that change a user call `invalidate` with the user id.
+    With a shared generation table the invalidation also reaches the other
+    workers on the host: every entry remembers the generation of its user id
+    and is discarded once that generation changes.
+
+    The user id is unknown until the lookup returns, so callers capture
+    `epoch()` before the lookup; any invalidation in between bumps the epoch
+    and `set` then leaves the possibly stale user uncached.
+    """
+
+    EPOCH_KEY = "*"
+
+    def __init__(self, max_size: int, ttl: float, generations: LocalGenerations | SharedGenerations) -> None:
+        self.cache: TTLCache[str, tuple[User, int | bytes]] = TTLCache(max_size, ttl)
+        self.generations = generations
+        self._usernames: dict[str, str] = {}
+
+    def _is_current(self, entry: tuple[User, int | bytes]) -> bool:
+        user, generation = entry
+        return generation == self.generations.get(str(user.id))
+
+    def epoch(self) -> int | bytes:
+        """Capture the invalidation epoch before looking up a user to `set`."""
+        return self.generations.get(self.EPOCH_KEY)
+
+    def get(self, username: str) -> User | None:
+        entry = self.cache.get(username, self._is_current)
+        return entry[0] if entry is not None else None
+
+    def set(self, user: User, epoch: int | bytes) -> None:
+        """Cache a user looked up after `epoch()` returned `epoch`, unless an invalidation happened since."""
+        user_id = str(user.id)
+        # Read the generation before checking the epoch: invalidate bumps them in the opposite order
+        generation = self.generations.get(user_id)
+        if self.epoch() != epoch:
+            return
+        self.cache.set(user.username, (user, generation))
+        self._usernames[user_id] = user.username
+        if len(self._usernames) > 2 * self.cache.max_size:
+            self._usernames = {str(user.id): user.username for user, _ in self.cache.values()}
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop the cached user with the given id in this and all sharing workers."""
+        username = self._usernames.pop(user_id, None)
+        if username is not None:
+            self.cache.pop(username)
+        self.generations.bump(self.EPOCH_KEY)
+        self.generations.bump(user_id)
+
+    def stats(self) -> dict[str, int]:
+        return self.cache.stats()
+
+
+def create_principal_cache() -> PrincipalCache:
+    if settings.PRINCIPAL_CACHE_INVALIDATION == "shared_memory":
+        generations = SharedGenerations(settings.PRINCIPAL_CACHE_SHM_PATH, settings.PRINCIPAL_CACHE_SHM_SLOTS)
+    else:
+        generations = LocalGenerations(settings.PRINCIPAL_CACHE_SHM_SLOTS)
+
+    return PrincipalCache(settings.PRINCIPAL_CACHE_MAX_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS, generations)
+
+
+principal_cache = create_principal_cache()
+register_structure("principals", principal_cache, lambda: len(principal_cache.cache))
@@ -0,0 +1,189 @@
+import cProfile
+import functools
+import marshal
+import os
+import signal
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from itertools import count
+from types import FrameType
+from typing import Any, Awaitable, Callable
+
+from core.config import settings
+from core.heap import register_structure
+
+
+class RequestProfile:
+    """CPU profile, collapsed stacks and dependency timings of one request."""
+    __slots__ = (
+        "id", "method", "path", "trigger", "started_at", "duration", "status",
+        "dependencies", "stats", "stacks", "samples",
+    )
+
+    def __init__(self, profile_id: str, method: str, path: str, trigger: str) -> None:
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = datetime.now(timezone.utc)
+        self.duration = 0.0
+        self.status = 500
+        self.dependencies: list[tuple[str, float]] = []
+        self.stats: dict = {}
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.samples = 0
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration,
+            "status": self.status,
+            "dependencies": [{"name": name, "seconds": seconds} for name, seconds in self.dependencies],
+            "stack_samples": self.samples,
+        }
+
+    def pstats_bytes(self) -> bytes:
+        """Serialize the profile the way `pstats.Stats.dump_stats` does, loadable with `pstats.Stats(path)`."""
+        return marshal.dumps(self.stats)
+
+    def collapsed_stacks(self) -> str:
+        """Render the stack samples as collapsed stacks, the input of flamegraph.pl and speedscope."""
+        return "".join(f"{';'.join(stack)} {samples}\n" for stack, samples in self.stacks.most_common())
+
+
+def _frame_label(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+class StackSampler:
+    """Sample the stack of one request every `interval` seconds of CPU time.
+
+    Samples are taken on SIGPROF, whose handler runs in the main thread
+    between bytecodes, where the event loop runs. A sample only counts when
+    the stack passes through the frame that started profiling, so time spent
+    on other requests is left out.
+    """
+
+    def __init__(self, profile: RequestProfile, root: FrameType, interval: float) -> None:
+        self.profile = profile
+        self.root = root
+        self.interval = interval
+        self._previous_handler = None
+
+    def _sample(self, signum: int, frame: FrameType | None) -> None:
+        stack = []
+        while frame is not None and frame is not self.root:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        if frame is None:
+            return
+        stack.reverse()
+        self.profile.stacks[tuple(stack)] += 1
+        self.profile.samples += 1
+
+    def start(self) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            # Signal handlers can only be installed from the main thread, stacks are then not sampled
+            return
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        if self._previous_handler is None:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler)
+
+
+_active_profile: ContextVar[RequestProfile | None] = ContextVar("active_profile", default=None)
+
+
+class Profiler:
+    """Profile one request at a time and keep the latest profiles in a ring buffer.
+
+    cProfile allows one active profiler per interpreter, so requests asking
+    for a profile while another one runs are served without it. The pstats
+    profile covers everything the event loop ran meanwhile, including other
+    requests; the collapsed stacks only cover the profiled request.
+    """
+
+    def __init__(self, buffer_size: int, stack_interval: float) -> None:
+        self.stack_interval = stack_interval
+        self.profiles: deque[RequestProfile] = deque(maxlen=buffer_size)
+        self.skipped = 0
+        self._ids = count(1)
+        self._active: tuple | None = None
+
+    def get(self, profile_id: str) -> RequestProfile | None:
+        for profile in self.profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    def start(self, method: str, path: str, trigger: str, root: FrameType) -> RequestProfile | None:
+        """Start profiling the request running in `root`, unless another request is being profiled."""
+        if self._active is not None:
+            self.skipped += 1
+            return None
+
+        cpu_profiler = cProfile.Profile()
+        try:
+            cpu_profiler.enable()
+        except ValueError:
+            # Another profiler, e.g. a debugger, is already active
+            self.skipped += 1
+            return None
+
+        profile = RequestProfile(f"{os.getpid()}-{next(self._ids)}", method, path, trigger)
+        sampler = StackSampler(profile, root, self.stack_interval)
+        sampler.start()
+        self._active = (cpu_profiler, sampler, _active_profile.set(profile), time.perf_counter())
+        return profile
+
+    def stop(self, profile: RequestProfile, status: int) -> None:
+        cpu_profiler, sampler, token, start = self._active
+        cpu_profiler.disable()
+        profile.duration = time.perf_counter() - start
+        sampler.stop()
+        _active_profile.reset(token)
+        self._active = None
+
+        cpu_profiler.create_stats()
+        profile.stats = cpu_profiler.stats
+        profile.status = status
+        self.profiles.append(profile)
+
+    def stats(self) -> dict[str, int]:
+        return {"profiles": len(self.profiles), "max_profiles": self.profiles.maxlen, "skipped": self.skipped}
+
+
+profiler = Profiler(settings.PROFILING_BUFFER_SIZE, settings.PROFILING_STACK_INTERVAL_SECONDS)
+register_structure("profiles", profiler.profiles)
+
+
+def profiled_dependency(func: Callable[..., Awaitable[Any]] | None = None, *, name: str | None = None):
+    """Record how long a dependency takes when the request it runs for is being profiled."""
+    if func is None:
+        return functools.partial(profiled_dependency, name=name)
+    label = name or func.__qualname__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return await func(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            profile.dependencies.append((label, time.perf_counter() - start))
+
+    return wrapper
@@ -0,0 +1,3 @@
+from core.rate_limit.backend import RateLimitBackend
+from core.rate_limit.limiter import RateLimiter, create_backend
+from core.rate_limit.memory import MemoryBackend
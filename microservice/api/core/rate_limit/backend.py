@@ -0,0 +1,61 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Callable
+
+
+class WindowCounter:
+    """Request counts for the current and previous fixed window of one key."""
+    __slots__ = ("window", "current", "previous")
+
+    def __init__(self, window: int, current: int = 0, previous: int = 0) -> None:
+        self.window = window
+        self.current = current
+        self.previous = previous
+
+    def advance(self, window: int) -> None:
+        """Roll the counter forward to the given window."""
+        if window != self.window:
+            self.previous = self.current if window == self.window + 1 else 0
+            self.current = 0
+            self.window = window
+
+
+def estimate(window: int, current: int, previous: int, now: float, window_seconds: int) -> int:
+    """Estimate the number of requests in the sliding window ending at `now`."""
+    now_window, offset = divmod(now, window_seconds)
+    now_window = int(now_window)
+
+    if now_window == window + 1:
+        current, previous = 0, current
+    elif now_window != window:
+        return 0
+
+    return int(previous * (1 - offset / window_seconds) + current)
+
+
+class RateLimitBackend(ABC):
+    """Storage for sliding-window request counters."""
+
+    clock: Callable[[], float] = staticmethod(time.monotonic)
+
+    def __init__(self, window_seconds: int) -> None:
+        self.window_seconds = window_seconds
+
+    @abstractmethod
+    def hit(self, key: str, now: float, limit: int | None = None) -> int:
+        """Count a request for a key unless it already reached the limit.
+
+        Returns the number of requests seen in the window before this one.
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Get the number of tracked keys."""
+
+    def reset_at(self, now: float) -> int:
+        """Get the wall-clock timestamp at which the current window ends."""
+        remaining = self.window_seconds - now % self.window_seconds
+        return int(time.time() + remaining)
+
+    def close(self) -> None:
+        """Release resources held by the backend."""
@@ -0,0 +1,71 @@
+import hashlib
+
+from core.config import settings
+from core.rate_limit.backend import RateLimitBackend
+
+
+def create_backend(namespace: str) -> RateLimitBackend:
+    """Create the rate limit backend configured in settings."""
+    window_seconds = settings.RATE_LIMIT_WINDOW_SECONDS
+
+    if settings.RATE_LIMIT_BACKEND == "shared_memory":
+        from core.rate_limit.shared_memory import SharedMemoryBackend
+        return SharedMemoryBackend(
+            f"{settings.RATE_LIMIT_SHM_PATH}-{namespace}",
+            window_seconds,
+            settings.RATE_LIMIT_SHM_SLOTS,
+            settings.RATE_LIMIT_SHM_STRIPES,
+        )
+
+    if settings.RATE_LIMIT_BACKEND == "network":
+        from core.rate_limit.network import NetworkStoreBackend
+        return NetworkStoreBackend(
+            settings.RATE_LIMIT_STORE_HOST,
+            settings.RATE_LIMIT_STORE_PORT,
+            window_seconds,
+            settings.RATE_LIMIT_MAX_KEYS,
+            settings.RATE_LIMIT_STORE_FLUSH_SECONDS,
+            namespace=f"{namespace}:",
+        )
+
+    from core.rate_limit.memory import MemoryBackend
+    return MemoryBackend(window_seconds, settings.RATE_LIMIT_MAX_KEYS)
+
+
+def token_key(token: str) -> str:
+    """Get the rate limit key of a bearer token, so backends and stores never see the token itself."""
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+
+class RateLimiter:
+    def __init__(
+            self,
+            ip_cache: RateLimitBackend | None = None,
+            token_cache: RateLimitBackend | None = None,
+    ) -> None:
+        self.ip_cache = ip_cache or create_backend("ip")
+        self.token_cache = token_cache or create_backend("token")
+
+    def is_rate_limited(self, ip: str, token: str | None = None) -> tuple[bool, dict[str, str]]:
+        now = self.ip_cache.clock()
+
+        if token:
+            limit = settings.RATE_LIMIT_AUTH_REQUESTS
+            used = self.token_cache.hit(token_key(token), now, limit)
+            if used < limit:
+                self.ip_cache.hit(ip, now)
+        else:
+            limit = settings.RATE_LIMIT_ANON_REQUESTS
+            used = self.ip_cache.hit(ip, now, limit)
+
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(max(0, limit - used)),
+            "X-RateLimit-Reset": str(self.ip_cache.reset_at(now)),
+        }
+
+        return used >= limit, headers
+
+    def close(self) -> None:
+        self.ip_cache.close()
+        self.token_cache.close()
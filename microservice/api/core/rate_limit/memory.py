@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from core.rate_limit.backend import RateLimitBackend, WindowCounter, estimate
+
+
+class MemoryBackend(RateLimitBackend):
+    """Sliding-window request counters with bounded, LRU-evicted per-key state.
+
+    Keys are kept in an ordered dict sorted by their last increment, which is
+    also their expiry order, so stale keys are dropped from the front instead
+    of scanning the whole cache.
+    """
+
+    def __init__(
+            self,
+            window_seconds: int,
+            max_keys: int,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(window_seconds)
+        self.max_keys = max_keys
+        self.clock = clock
+        self._counters: OrderedDict[str, WindowCounter] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._counters
+
+    def _expire(self, window: int) -> None:
+        """Drop keys whose last increment is older than the previous window."""
+        counters = self._counters
+        while counters:
+            key, counter = next(iter(counters.items()))
+            if window - counter.window < 2:
+                break
+            del counters[key]
+
+    def count(self, key: str, now: float) -> int:
+        """Get the estimated number of requests for a key in the sliding window."""
+        counter = self._counters.get(key)
+        if counter is None:
+            return 0
+        return estimate(counter.window, counter.current, counter.previous, now, self.window_seconds)
+
+    def increment(self, key: str, now: float, amount: int = 1) -> WindowCounter:
+        """Record requests for a key."""
+        window = int(now // self.window_seconds)
+        self._expire(window)
+
+        counters = self._counters
+        counter = counters.get(key)
+        if counter is None:
+            if len(counters) >= self.max_keys:
+                counters.popitem(last=False)
+            counter = counters[key] = WindowCounter(window)
+        else:
+            counters.move_to_end(key)
+            counter.advance(window)
+
+        counter.current += amount
+        return counter
+
+    def hit(self, key: str, now: float, limit: int | None = None) -> int:
+        used = self.count(key, now)
+        if limit is None or used < limit:
+            self.increment(key, now)
+        return used
@@ -0,0 +1,129 @@
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from core.rate_limit.backend import RateLimitBackend, WindowCounter, estimate
+
+
+class NetworkStoreBackend(RateLimitBackend):
+    """Sliding-window counters kept in a network store shared by all workers.
+
+    Requests are counted locally and pushed to the store in batches by a
+    background thread; every flush returns the store's counters for the
+    flushed keys, which are combined with the not-yet-flushed increments.
+    Limits are therefore enforced across workers with a staleness of at most
+    one flush interval.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(
+            self,
+            host: str,
+            port: int,
+            window_seconds: int,
+            max_keys: int,
+            flush_interval: float,
+            namespace: str = "",
+            timeout: float = 1.0,
+    ) -> None:
+        super().__init__(window_seconds)
+        self.host = host
+        self.port = port
+        self.max_keys = max_keys
+        self.flush_interval = flush_interval
+        self.namespace = namespace
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pending: dict[str, int] = {}
+        self._inflight: dict[str, int] = {}
+        self._remote: OrderedDict[str, WindowCounter] = OrderedDict()
+        self._socket: socket.socket | None = None
+        self._reader = None
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rate-limit-flush", daemon=True)
+        self._thread.start()
+
+    def hit(self, key: str, now: float, limit: int | None = None) -> int:
+        with self._lock:
+            counter = self._remote.get(key)
+            used = self._pending.get(key, 0) + self._inflight.get(key, 0)
+            if counter is not None:
+                used += estimate(counter.window, counter.current, counter.previous, now, self.window_seconds)
+
+            if limit is None or used < limit:
+                self._pending[key] = self._pending.get(key, 0) + 1
+        return used
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._remote.keys() | self._pending.keys())
+
+    def _connect(self) -> None:
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._socket.makefile("rb")
+
+    def _disconnect(self) -> None:
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+        self._socket = None
+        self._reader = None
+
+    def _request(self, message: dict) -> dict:
+        if self._socket is None:
+            self._connect()
+        self._socket.sendall(json.dumps(message).encode() + b"\n")
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Rate limit store closed the connection")
+        return json.loads(line)
+
+    def flush(self) -> None:
+        """Push pending increments to the store and refresh their counters."""
+        with self._lock:
+            pending = self._inflight = self._pending
+            self._pending = {}
+        if not pending:
+            return
+
+        try:
+            response = self._request({
+                "window": self.window_seconds,
+                "incr": {self.namespace + key: amount for key, amount in pending.items()},
+            })
+        except (OSError, ValueError):
+            self._disconnect()
+            # Keep the increments so they are retried on the next flush
+            with self._lock:
+                self._inflight = {}
+                for key, amount in pending.items():
+                    if len(self._pending) >= self.max_keys:
+                        break
+                    self._pending[key] = self._pending.get(key, 0) + amount
+            return
+
+        prefix = len(self.namespace)
+        with self._lock:
+            self._inflight = {}
+            remote = self._remote
+            for key, (window, current, previous) in response["counters"].items():
+                key = key[prefix:]
+                remote[key] = WindowCounter(window, current, previous)
+                remote.move_to_end(key)
+            while len(remote) > self.max_keys:
+                remote.popitem(last=False)
+
+    def _run(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+        self._disconnect()
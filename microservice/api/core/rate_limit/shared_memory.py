@@ -0,0 +1,103 @@
+import fcntl
+import hashlib
+import os
+import struct
+import time
+
+from core.cache import open_shared_table
+from core.rate_limit.backend import RateLimitBackend, estimate
+
+# Header: magic, window seconds, slot count, stripe count
+HEADER = struct.Struct("<4sIII")
+# Slot: key hash, window index, current count, previous count
+SLOT = struct.Struct("<QqII")
+MAGIC = b"WRL1"
+PROBE_LIMIT = 16
+
+
+class SharedMemoryBackend(RateLimitBackend):
+    """Sliding-window counters in an mmap'd hash table shared by all workers on a host.
+
+    The table is split into stripes, each guarded by a byte-range lock on the
+    backing file, so workers only contend when they touch the same stripe.
+    Keys are stored as 64-bit digests with bounded linear probing; when a
+    probe run is full the slot with the oldest window is evicted.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(
+            self,
+            path: str,
+            window_seconds: int,
+            slots: int,
+            stripes: int,
+    ) -> None:
+        super().__init__(window_seconds)
+        self.path = path
+        self.stripes = stripes
+        self.slots_per_stripe = max(slots // stripes, 1)
+        self.slots = self.slots_per_stripe * stripes
+
+        header = HEADER.pack(MAGIC, self.window_seconds, self.slots, self.stripes)
+        self._fd, self._map = open_shared_table(path, HEADER.size + self.slots * SLOT.size, header)
+
+    def _digest(self, key: str) -> int:
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        # Zero marks an empty slot
+        return int.from_bytes(digest, "little") | 1
+
+    def _find_slot(self, stripe: int, digest: int, window: int) -> int:
+        """Find the slot offset for a digest, claiming a free or stale one if absent."""
+        base = stripe * self.slots_per_stripe
+        start = digest % self.slots_per_stripe
+        candidate = None
+        oldest = None
+
+        for probe in range(min(PROBE_LIMIT, self.slots_per_stripe)):
+            offset = HEADER.size + (base + (start + probe) % self.slots_per_stripe) * SLOT.size
+            slot_digest, slot_window, _, _ = SLOT.unpack_from(self._map, offset)
+            if slot_digest == digest:
+                return offset
+            if candidate is None and (slot_digest == 0 or window - slot_window >= 2):
+                candidate = offset
+            if oldest is None or slot_window < oldest[1]:
+                oldest = (offset, slot_window)
+
+        offset = candidate if candidate is not None else oldest[0]
+        SLOT.pack_into(self._map, offset, digest, window, 0, 0)
+        return offset
+
+    def hit(self, key: str, now: float, limit: int | None = None) -> int:
+        digest = self._digest(key)
+        stripe = digest % self.stripes
+        window = int(now // self.window_seconds)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+        try:
+            offset = self._find_slot(stripe, digest, window)
+            _, slot_window, current, previous = SLOT.unpack_from(self._map, offset)
+            used = estimate(slot_window, current, previous, now, self.window_seconds)
+
+            if limit is None or used < limit:
+                if window != slot_window:
+                    previous = current if window == slot_window + 1 else 0
+                    current = 0
+                SLOT.pack_into(self._map, offset, digest, window, current + 1, previous)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+
+        return used
+
+    def __len__(self) -> int:
+        window = int(self.clock() // self.window_seconds)
+        count = 0
+        for index in range(self.slots):
+            digest, slot_window, _, _ = SLOT.unpack_from(self._map, HEADER.size + index * SLOT.size)
+            if digest and window - slot_window < 2:
+                count += 1
+        return count
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
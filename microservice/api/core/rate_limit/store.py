@@ -0,0 +1,63 @@
+"""Stand-in network store for the rate limiter.
+
+Speaks newline-delimited JSON: each request carries the window size and a
+batch of increments, each response carries the updated counters.
+
+    python -m core.rate_limit.store --host 127.0.0.1 --port 6390
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from core.rate_limit.memory import MemoryBackend
+
+
+class RateLimitStore:
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self.backends: dict[int, MemoryBackend] = {}
+
+    def apply(self, window_seconds: int, increments: dict[str, int]) -> dict[str, list[int]]:
+        """Apply a batch of increments and return the resulting counters."""
+        backend = self.backends.get(window_seconds)
+        if backend is None:
+            backend = self.backends[window_seconds] = MemoryBackend(window_seconds, self.max_keys, time.time)
+
+        now = backend.clock()
+        counters = {}
+        for key, amount in increments.items():
+            counter = backend.increment(key, now, amount)
+            counters[key] = [counter.window, counter.current, counter.previous]
+        return counters
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                counters = self.apply(message["window"], message["incr"])
+                writer.write(json.dumps({"counters": counters}).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError, KeyError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--max-keys", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    asyncio.run(RateLimitStore(args.max_keys).serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 from fastapi import Depends, status, HTTPException
-from jose import jwt
 from jose.exceptions import JWTError
 
+from core.cache import SharedMaxima, TTLCache
 from core.config import settings
-from core.security import oauth2_scheme
+from core.heap import register_structure
+from core.principal_cache import principal_cache
+from core.profiling import profiled_dependency
+from core.security import oauth2_scheme, decode_access_token
 from schemas.token import TokenData
 from schemas.user import Role, Permission, User
 
@@ -37,6 +40,78 @@ ROLE_PERMISSIONS: dict[Role, list[Permission]] = {
     ]
 }
 
+# Permissions compiled into bitmasks
+PERMISSION_BITS: dict[Permission, int] = {permission: 1 << index for index, permission in enumerate(Permission)}
+
+
+def permission_mask(permissions) -> int:
+    """Combine permissions into a bitmask."""
+    mask = 0
+    for permission in permissions:
+        mask |= PERMISSION_BITS.get(permission, 0)
+    return mask
+
+
+ROLE_MASKS: dict[Role, int] = {role: permission_mask(permissions) for role, permissions in ROLE_PERMISSIONS.items()}
+
+
+class PermissionVersions:
+    """Lowest permissions version still accepted in stateless tokens, per user id.
+
+    Raised whenever a user's role, permissions or status change, so tokens
+    minted before the change stop being trusted on their own claims. The
+    floors only reach the workers that share them, so tokens are also checked
+    against the permissions version and status stored with the user, read
+    through a short-lived cache.
+    """
+
+    def __init__(self, max_size: int, state_ttl: float, shared: SharedMaxima | None = None) -> None:
+        self.shared = shared
+        self.states: TTLCache[str, tuple[int, bool]] = TTLCache(max_size, state_ttl)
+        self._floors: dict[str, int] = {}
+
+    def floor(self, user_id: str) -> int:
+        floor = self._floors.get(user_id, 0)
+        if self.shared is not None:
+            floor = max(floor, self.shared.get(user_id))
+        return floor
+
+    def revoke_before(self, user_id: str, version: int) -> None:
+        """Stop trusting tokens minted before the given permissions version."""
+        if version > self._floors.get(user_id, 0):
+            self._floors[user_id] = version
+        if self.shared is not None:
+            self.shared.raise_to(user_id, version)
+        self.states.pop(user_id)
+
+    def revoke_all(self, user_id: str) -> None:
+        """Stop trusting any stateless token of a user, e.g. after deletion."""
+        self.revoke_before(user_id, 2 ** 63)
+
+    async def is_current(self, user_id: str, version: int) -> bool:
+        """Check that tokens of a permissions version are still trusted and their user is enabled."""
+        if version < self.floor(user_id):
+            return False
+
+        state = self.states.get(user_id)
+        if state is None:
+            state = await _get_permission_state(user_id)
+            if state is None:
+                return False
+            self.states.set(user_id, state)
+
+        stored_version, disabled = state
+        return not disabled and version >= stored_version
+
+
+permission_versions = PermissionVersions(
+    settings.PRINCIPAL_CACHE_MAX_SIZE,
+    settings.PERMISSION_STATE_CACHE_TTL_SECONDS,
+    SharedMaxima(settings.PERMISSION_VERSIONS_SHM_PATH, settings.PRINCIPAL_CACHE_SHM_SLOTS)
+    if settings.PRINCIPAL_CACHE_INVALIDATION == "shared_memory" else None,
+)
+register_structure("permission_states", permission_versions.states)
+
 _user_module = None
 
 
@@ -45,16 +120,24 @@ def get_permissions_for_role(role):
     return ROLE_PERMISSIONS.get(role, [])
 
 
-async def _get_user_by_username(username: str) -> User | None:
-    """Lazily import and call the user module function"""
+def _get_user_module():
+    """Lazily import the user module"""
     global _user_module
     if _user_module is None:
         import models.user as user_module
         _user_module = user_module
+    return _user_module
 
-    return await _user_module.get_user_by_username(username)
 
+async def _get_user_by_username(username: str) -> User | None:
+    return await _get_user_module().get_user_by_username(username)
 
+
+async def _get_permission_state(user_id: str) -> tuple[int, bool] | None:
+    return await _get_user_module().get_permission_state(user_id)
+
+
+@profiled_dependency
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """Get the current user from a JWT token."""
     credential_exception = HTTPException(
@@ -64,7 +147,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
 
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(token)
         username: str = payload.get("name")
 
         if username is None:
@@ -73,33 +156,98 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credential_exception
 
+    user = principal_cache.get(token_data.username)
+    if user is not None:
+        return user
+
+    epoch = principal_cache.epoch()
     user = await _get_user_by_username(token_data.username)
     if user is None:
         raise credential_exception
+    principal_cache.set(user, epoch)
     return user
 
 
+@profiled_dependency
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if current_user.disabled:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
     return current_user
 
 
+def get_permission_mask(user: User) -> int:
+    """Get the bitmask of all permissions a user has through its role or directly."""
+    return ROLE_MASKS.get(user.role, 0) | permission_mask(user.permissions)
+
+
 def has_permission(user: User, required_permission: Permission) -> bool:
     """Check if a user has a specific permission."""
-    role_permission = ROLE_PERMISSIONS.get(user.role) if user.role else []
-    all_permissions = set(role_permission + user.permissions)
+    return bool(get_permission_mask(user) & PERMISSION_BITS[required_permission])
+
+
+def create_user_claims(user: User) -> dict:
+    """Build the access token claims for a user."""
+    claims = {"name": user.username}
+    if settings.STATELESS_AUTH:
+        claims.update({
+            "sub": str(user.id),
+            "role": user.role,
+            "perm": get_permission_mask(user),
+            "pv": user.permissions_version,
+        })
+    return claims
+
 
-    return required_permission in all_permissions
+async def get_claims_permission_mask(claims: dict) -> int | None:
+    """Get the permission mask of stateless token claims that are still current."""
+    mask, version, user_id = claims.get("perm"), claims.get("pv"), claims.get("sub")
+    if mask is None or version is None or user_id is None:
+        return None
+    if not await permission_versions.is_current(user_id, version):
+        return None
+    return mask
 
 
 def require_permission(permission: Permission):
+    bit = PERMISSION_BITS[permission]
+    insufficient_permissions = HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Insufficient permissions"
+    )
+
+    if settings.STATELESS_AUTH:
+        @profiled_dependency(name=f"require_permission({permission.value})")
+        async def permission_dependencies(token: str = Depends(oauth2_scheme)):
+            try:
+                mask = await get_claims_permission_mask(decode_access_token(token))
+            except JWTError:
+                mask = None
+
+            if mask is None:
+                # Stale or stateful token, authorize against the stored user
+                current_user = await get_current_active_user(await get_current_user(token))
+                mask = get_permission_mask(current_user)
+
+            if not mask & bit:
+                raise insufficient_permissions
+
+        return permission_dependencies
+
+    @profiled_dependency(name=f"require_permission({permission.value})")
     async def permission_dependencies(current_user: User = Depends(get_current_active_user)):
-        if not has_permission(current_user, permission):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Insufficient permissions"
-            )
+        if not get_permission_mask(current_user) & bit:
+            raise insufficient_permissions
         return current_user
 
     return permission_dependencies
+
+
+async def token_has_permission(token: str, permission: Permission) -> bool:
+    """Check a bearer token for a permission outside the dependency chain, e.g. in middleware."""
+    try:
+        mask = await get_claims_permission_mask(decode_access_token(token)) if settings.STATELESS_AUTH else None
+        if mask is None:
+            mask = get_permission_mask(await get_current_active_user(await get_current_user(token)))
+    except (JWTError, HTTPException):
+        return False
+    return bool(mask & PERMISSION_BITS[permission])
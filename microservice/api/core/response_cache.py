@@ -0,0 +1,228 @@
+import fcntl
+import hashlib
+import json
+import os
+import struct
+from collections import OrderedDict
+from typing import NamedTuple
+
+from core.cache import open_shared_table
+from core.config import settings
+from core.heap import register_structure
+
+# Header: magic, slot count, slot size
+HEADER = struct.Struct("<4sII")
+# Slot: key digest, revision, headers length, body length
+SLOT = struct.Struct("<16s8sII")
+MAGIC = b"WRC1"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: dict[str, str]
+
+
+def _revision_bytes(revision: int) -> bytes:
+    return revision.to_bytes(8, "little")
+
+
+class MemoryResponseStore:
+    """LRU of serialized responses of one worker, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        self._entries: OrderedDict[bytes, tuple[bytes, CachedResponse, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> tuple[bytes, CachedResponse] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0], entry[1]
+
+    def set(self, key: bytes, revision: bytes, response: CachedResponse) -> None:
+        size = len(key) + len(response.body) + sum(len(name) + len(value) for name, value in response.headers.items())
+        if size > self.max_entry_bytes:
+            return
+
+        self.pop(key)
+        while self._entries and self.size_bytes + size > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.size_bytes -= evicted_size
+            self.evictions += 1
+
+        self._entries[key] = (revision, response, size)
+        self.size_bytes += size
+
+    def pop(self, key: bytes) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class SharedMemoryResponseStore:
+    """Direct-mapped table of serialized responses in an mmap'd file shared by all workers on a host.
+
+    Each key hashes to one fixed-size slot guarded by a byte-range lock; a
+    new entry simply replaces whatever the slot held, so the file size is
+    the byte bound. Responses that do not fit in a slot are not cached.
+    """
+
+    def __init__(self, path: str, slots: int, slot_bytes: int) -> None:
+        self.path = path
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.max_entry_bytes = slot_bytes - SLOT.size
+        self.evictions = 0
+
+        header = HEADER.pack(MAGIC, slots, slot_bytes)
+        self._fd, self._map = open_shared_table(path, HEADER.size + slots * slot_bytes, header)
+
+    def _offset(self, key: bytes) -> int:
+        return HEADER.size + int.from_bytes(key[:8], "little") % self.slots * self.slot_bytes
+
+    def get(self, key: bytes) -> tuple[bytes, CachedResponse] | None:
+        offset = self._offset(key)
+        fcntl.lockf(self._fd, fcntl.LOCK_SH, self.slot_bytes, offset)
+        try:
+            digest, revision, headers_length, body_length = SLOT.unpack_from(self._map, offset)
+            if digest != key:
+                return None
+            start = offset + SLOT.size
+            headers = self._map[start:start + headers_length]
+            body = self._map[start + headers_length:start + headers_length + body_length]
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_bytes, offset)
+        return revision, CachedResponse(body, json.loads(headers))
+
+    def set(self, key: bytes, revision: bytes, response: CachedResponse) -> None:
+        headers = json.dumps(response.headers).encode()
+        if len(headers) + len(response.body) > self.max_entry_bytes:
+            return
+
+        offset = self._offset(key)
+        start = offset + SLOT.size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_bytes, offset)
+        try:
+            if SLOT.unpack_from(self._map, offset)[0] not in (key, bytes(16)):
+                self.evictions += 1
+            SLOT.pack_into(self._map, offset, key, revision, len(headers), len(response.body))
+            self._map[start:start + len(headers)] = headers
+            self._map[start + len(headers):start + len(headers) + len(response.body)] = response.body
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_bytes, offset)
+
+    def pop(self, key: bytes) -> None:
+        offset = self._offset(key)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_bytes, offset)
+        try:
+            if SLOT.unpack_from(self._map, offset)[0] == key:
+                SLOT.pack_into(self._map, offset, bytes(16), bytes(8), 0, 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_bytes, offset)
+
+    def clear(self) -> None:
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            self._map[HEADER.size:] = bytes(len(self._map) - HEADER.size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "slots": self.slots,
+            "max_bytes": self.slots * self.slot_bytes,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class ResponseCache:
+    """Serialized responses keyed by owner, route and normalized parameters.
+
+    Every entry remembers the revision of its owner's widgets the response
+    was computed at, and is discarded once a lookup brings a newer one. The
+    revision is stored in MongoDB and bumped by every widget write, so a
+    write on any worker or host invalidates all of an owner's responses.
+    """
+
+    def __init__(self, store: MemoryResponseStore | SharedMemoryResponseStore) -> None:
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def key(owner_id: str, route: str, params: tuple) -> bytes:
+        return hashlib.blake2b(repr((owner_id, route, params)).encode(), digest_size=16).digest()
+
+    def get(self, key: bytes, revision: int) -> CachedResponse | None:
+        """Get a response computed at the current `revision` of the owner's widgets."""
+        entry = self.store.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        cached_revision, response = entry
+        if cached_revision != _revision_bytes(revision):
+            self.store.pop(key)
+            self.stale += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return response
+
+    def set(self, key: bytes, revision: int, response: CachedResponse) -> None:
+        """Cache a response, given the revision read before computing it."""
+        self.store.set(key, _revision_bytes(revision), response)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            **self.store.stats(),
+        }
+
+
+def create_response_cache() -> ResponseCache:
+    if settings.RESPONSE_CACHE_BACKEND == "shared_memory":
+        store = SharedMemoryResponseStore(
+            settings.RESPONSE_CACHE_SHM_PATH,
+            settings.RESPONSE_CACHE_SHM_SLOTS,
+            settings.RESPONSE_CACHE_SHM_SLOT_BYTES,
+        )
+    else:
+        store = MemoryResponseStore(settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_MAX_ENTRY_BYTES)
+
+    return ResponseCache(store)
+
+
+response_cache = create_response_cache()
+if isinstance(response_cache.store, MemoryResponseStore):
+    # The shared store lives in its mmap'd file, outside the heap
+    register_structure("responses", response_cache.store)
@@ -1,15 +1,33 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta, datetime, timezone
+from typing import Any, Callable
 
+from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from passlib.context import CryptContext
 
+from core.cache import TTLCache
 from core.config import settings
+from core.heap import register_structure
+from core.metrics import password_hash_duration, password_hashing
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified token claims keyed by the token's SHA-256 digest
+token_cache: TTLCache[bytes, dict] = TTLCache(
+    settings.TOKEN_CACHE_MAX_SIZE,
+    settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+_token_cache_secret = settings.SECRET_KEY
+register_structure("tokens", token_cache)
+
 
 def get_password_hash(password: str) -> str:
     """Hash a password for storing."""
@@ -21,6 +39,92 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHasher:
+    """Bounded thread pool running bcrypt off the event loop.
+
+    bcrypt releases the GIL, so hashing in threads keeps the loop free for
+    other requests. Once all workers are busy and the queue is full, new
+    calls are rejected right away with 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.in_flight = 0
+        self.rejections = 0
+        self.completed = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    def _timed(self, func: Callable[..., Any], *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.completed += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+                password_hash_duration.observe(elapsed)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.in_flight >= self.capacity:
+            self.rejections += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+
+        with self._lock:
+            self.in_flight += 1
+        # A cancelled caller stops waiting but bcrypt keeps its worker, so
+        # the slot is released when the executor future is done, not here
+        future = self._executor.submit(self._timed, func, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "rejections": self.rejections,
+            "completed": self.completed,
+            "mean_seconds": self.total_seconds / self.completed if self.completed else 0.0,
+            "max_seconds": self.max_seconds,
+        }
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE)
+password_hashing.collect = lambda: (
+    (("in_flight",), password_hasher.in_flight),
+    (("queue_depth",), password_hasher.queue_depth),
+    (("rejections",), password_hasher.rejections),
+)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password for storing without blocking the event loop."""
+    return await password_hasher.run(get_password_hash, password)
+
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a hashed password without blocking the event loop."""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -34,3 +138,25 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
+
+
+def decode_access_token(token: str) -> dict:
+    """Decode and verify a JWT access token, reusing claims verified earlier."""
+    if not settings.TOKEN_CACHE_ENABLED:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+    global _token_cache_secret
+    if settings.SECRET_KEY != _token_cache_secret:
+        # Tokens verified with a rotated key must be verified again
+        token_cache.clear()
+        _token_cache_secret = settings.SECRET_KEY
+
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is None:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        expires_at = None
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = token_cache.clock() + claims["exp"] - time.time()
+        token_cache.set(key, claims, expires_at)
+    return claims
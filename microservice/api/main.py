@@ -1,13 +1,47 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from api import routers
 from core.config import settings
+from core.indexes import reconcile_indexes
 from core.middleware import add_middleware
+from models.widget_counter import reconcile_counters
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_counters_periodically(interval: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            report = await reconcile_counters()
+        except Exception:
+            logger.exception("Widget counter reconciliation failed")
+            continue
+        if report["drifted"]:
+            logger.warning("Corrected %d drifted widget counters", len(report["drifted"]))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await reconcile_indexes()
+
+    reconciler = None
+    if settings.WIDGET_COUNTER_RECONCILE_SECONDS > 0:
+        reconciler = asyncio.create_task(reconcile_counters_periodically(settings.WIDGET_COUNTER_RECONCILE_SECONDS))
+    yield
+    if reconciler is not None:
+        reconciler.cancel()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API for CRUD operations on widgets",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 add_middleware(app)
@@ -1,57 +1,122 @@
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from pydantic import EmailStr
 
 from core.database import users_collection
-from core.rbac import get_permissions_for_role
+from core.indexes import check_query_plan
+from core.principal_cache import principal_cache
+from core.rbac import get_permissions_for_role, permission_versions
 from schemas.user import User, UserCreate, Role, Permission, UserUpdate
-from core.security import get_password_hash, verify_password
+from core.security import hash_password, check_password
+from utils.documents import from_document
+from utils.etag import VersionConflict, version_filter
+from utils.pagination import keyset_filter, keyset_sort
+from utils.projection import partial_model, projection
+
+
+def permissions_changed(user_id: str, version: int) -> None:
+    """Drop cached state and stateless tokens that predate a permission change."""
+    principal_cache.invalidate(user_id)
+    permission_versions.revoke_before(user_id, version)
+
+
+def duplicate_key_message(error: DuplicateKeyError) -> str:
+    """Describe which unique index a write collided with."""
+    key_pattern = (error.details or {}).get("keyPattern", {})
+    if "username" in key_pattern:
+        return "Username already exists"
+    if "email" in key_pattern:
+        return "Email already exists."
+    return "User already exists"
 
 
 def get_if_user_exists(user) -> User | None:
     if user:
-        return User.model_validate(user)
+        # Stored documents were validated on write
+        return from_document(User, user)
     return None
 
 
 async def get_user_by_username(username: str) -> User | None:
     """Get a user by username."""
-    user = await users_collection.find_one({"username": username})
+    query = {"username": username}
+    await check_query_plan(users_collection, query)
+    user = await users_collection.find_one(query)
     return get_if_user_exists(user)
 
 
 async def get_user_by_email(email: EmailStr) -> User | None:
     """Get a user by email."""
-    user = await users_collection.find_one({"email": email})
+    query = {"email": email}
+    await check_query_plan(users_collection, query)
+    user = await users_collection.find_one(query)
     return get_if_user_exists(user)
 
 
-async def get_user_by_id(user_id: str) -> User | None:
-    """Get a user by id."""
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-    return get_if_user_exists(user)
+async def get_user_by_id(user_id: str, fields: tuple[str, ...] | None = None) -> User | None:
+    """Get a user by id, loading only `fields` when given."""
+    user = await users_collection.find_one({"_id": ObjectId(user_id)}, projection(User, fields))
+    if user:
+        return from_document(partial_model(User, fields), user)
+    return None
+
+
+async def get_user_version(user_id: str) -> int | None:
+    """Get the version of a user by id without loading the user."""
+    user = await users_collection.find_one({"_id": ObjectId(user_id)}, {"version": 1})
+    if user:
+        return user.get("version", 0)
+    return None
+
+
+async def get_permission_state(user_id: str) -> tuple[int, bool] | None:
+    """Get the permissions version and disabled status of a user by id without loading the user."""
+    user = await users_collection.find_one({"_id": ObjectId(user_id)}, {"permissions_version": 1, "disabled": 1})
+    if user:
+        return user.get("permissions_version", 0), user.get("disabled", False)
+    return None
 
 
 async def create_user(user: UserCreate) -> User:
-    """Create a new user."""
+    """Create a new user.
+
+    Raises ValueError if the username or email is taken; uniqueness is
+    enforced by the unique indexes rather than checked up front.
+    """
     user_dict = user.model_dump()
-    user_dict["password"] = get_password_hash(user_dict["password"])
+    user_dict["password"] = await hash_password(user_dict["password"])
 
     role = user_dict.get("role", Role.USER)
     permissions = get_permissions_for_role(role)
     user_dict["permissions"] = permissions
     user_dict["disabled"] = False
+    user_dict["version"] = 0
 
-    result = await users_collection.insert_one(user_dict)
+    try:
+        result = await users_collection.insert_one(user_dict)
+    except DuplicateKeyError as e:
+        raise ValueError(duplicate_key_message(e))
     user_dict["_id"] = result.inserted_id
 
     return User.model_validate(user_dict)
 
 
-async def get_all_users(skip: int = 0, limit: int = 100) -> list[User]:
-    """Get all users (for admin purposes)"""
-    cursor = users_collection.find().skip(skip).limit(limit)
-    return [User.model_validate(user) async for user in cursor]
+async def get_all_users(
+        skip: int = 0,
+        limit: int = 100,
+        after: str | None = None,
+        fields: tuple[str, ...] | None = None,
+) -> list[User]:
+    """Get all users (for admin purposes) in _id order, optionally after a pagination cursor.
+
+    Only `fields` are loaded and returned when given.
+    """
+    query = keyset_filter(after) if after else {}
+    model = partial_model(User, fields)
+    cursor = users_collection.find(query, projection(User, fields)).sort(keyset_sort()).skip(skip).limit(limit)
+    return [from_document(model, user) async for user in cursor]
 
 
 async def authenticate_user(username: str, password: str) -> User | None:
@@ -59,107 +124,117 @@ async def authenticate_user(username: str, password: str) -> User | None:
     user_dict = await users_collection.find_one({"username": username})
     if not user_dict:
         return None
-    if not verify_password(password, user_dict["password"]):
+    if not await check_password(password, user_dict["password"]):
         return None
-    return User.model_validate(user_dict)
+    return from_document(User, user_dict)
 
 
 async def update_user_status(user_id: str, disabled: bool) -> bool:
     """Update a user`s disabled status"""
-    result = await users_collection.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"disabled": disabled}}
+    result = await users_collection.find_one_and_update(
+        {"_id": ObjectId(user_id), "disabled": {"$ne": disabled}},
+        {"$set": {"disabled": disabled}, "$inc": {"permissions_version": 1, "version": 1}},
+        projection={"permissions_version": 1},
+        return_document=ReturnDocument.AFTER,
     )
-    return result.modified_count == 1
+    if result is None:
+        return False
+
+    permissions_changed(user_id, result["permissions_version"])
+    return True
 
 
 async def update_user_role(user_id: str, role: Role) -> User | None:
     """Update a user`s role"""
     permissions = get_permissions_for_role(role)
 
-    result = await users_collection.update_one(
+    user = await users_collection.find_one_and_update(
         {"_id": ObjectId(user_id)},
-        {"$set": {"role": role, "permissions": permissions}}
+        {"$set": {"role": role, "permissions": permissions}, "$inc": {"permissions_version": 1, "version": 1}},
+        return_document=ReturnDocument.AFTER,
     )
+    if user is None:
+        return None
 
-    if result.modified_count == 1:
-        return await get_user_by_id(user_id)
-    return None
+    permissions_changed(user_id, user["permissions_version"])
+    return from_document(User, user)
 
 
-async def add_user_permission(user_id: str, permission: Permission) -> User | None:
-    """Add a permission to a user"""
-    user = await get_user_by_id(user_id)
-    if not user:
-        return None
+async def _change_permissions(user_id: str, query: dict, update: dict) -> User | None:
+    """Apply a permission change that only matches when it changes something.
 
-    current_permissions = user.permissions
-    if permission not in current_permissions:
-        current_permissions.append(permission)
+    If nothing matched, the user either does not exist or already was in the
+    requested state, and is returned as is.
+    """
+    user = await users_collection.find_one_and_update(
+        {"_id": ObjectId(user_id), **query},
+        {**update, "$inc": {"permissions_version": 1, "version": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if user is None:
+        return await get_user_by_id(user_id)
 
-        await users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {"permissions": current_permissions}}
-        )
+    permissions_changed(user_id, user["permissions_version"])
+    return from_document(User, user)
 
-        return await get_user_by_id(user_id)
-    return user
+
+async def add_user_permission(user_id: str, permission: Permission) -> User | None:
+    """Add a permission to a user"""
+    return await _change_permissions(
+        user_id,
+        {"permissions": {"$ne": permission}},
+        {"$addToSet": {"permissions": permission}},
+    )
 
 
 async def remove_user_permission(user_id: str, permission: Permission) -> User | None:
     """Remove a permission from a user"""
-    user = await get_user_by_id(user_id)
-    if not user:
-        return None
-
-    current_permissions = user.permissions
-    if permission in current_permissions:
-        current_permissions.remove(permission)
+    return await _change_permissions(
+        user_id,
+        {"permissions": permission},
+        {"$pull": {"permissions": permission}},
+    )
 
-        await users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {"permissions": current_permissions}}
-        )
 
-        return await get_user_by_id(user_id)
-    return user
+async def update_user(user_id: str, user_update: UserUpdate, version: int | None = None) -> User | None:
+    """Update a user.
 
-
-async def update_user(user_id: str, user_update: UserUpdate) -> User | None:
-    """Update a user"""
-    user = await get_user_by_id(user_id)
-    if not user:
-        return None
+    Raises ValueError if the new username or email is taken by another user.
+    With `version`, only a user still at that version is updated and
+    VersionConflict is raised if it moved on.
+    """
+    query = {"_id": ObjectId(user_id)}
+    if version is not None:
+        query.update(version_filter(version))
 
     update_data = {}
-
-    if user_update.username is not None and user_update.username != user.username:
-        existing_user = await get_user_by_username(user_update.username)
-        if existing_user and existing_user.id != user_id:
-            raise ValueError("Username already exists")
+    if user_update.username is not None:
         update_data["username"] = user_update.username
-
-    if user_update.email is not None and user_update.email != user.email:
-        existing_email = await get_user_by_email(user_update.email)
-        if existing_email and existing_email.id != user_id:
-            raise ValueError("Email already exists.")
+    if user_update.email is not None:
         update_data["email"] = user_update.email
-
     if user_update.password is not None:
-        update_data["password"] = get_password_hash(user_update.password)
+        update_data["password"] = await hash_password(user_update.password)
+
+    try:
+        if update_data:
+            user = await users_collection.find_one_and_update(
+                query,
+                {"$set": update_data, "$inc": {"version": 1}},
+                return_document=ReturnDocument.AFTER,
+            )
+        else:
+            user = await users_collection.find_one(query)
+    except DuplicateKeyError as e:
+        raise ValueError(duplicate_key_message(e))
+
+    if user is None:
+        if version is not None and await get_user_version(user_id) is not None:
+            raise VersionConflict("User was modified")
+        return None
 
     if update_data:
-        result = await users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": update_data}
-        )
-
-        if result.modified_count == 1 or result.matched_count == 1:
-            return await get_user_by_id(user_id)
-    else:
-        return user
-
-    return None
+        principal_cache.invalidate(user_id)
+    return from_document(User, user)
 
 
 async def delete_user(user_id: str) -> bool:
@@ -174,8 +249,15 @@ async def delete_user(user_id: str) -> bool:
             return False
 
     result = await users_collection.delete_one({"_id": ObjectId(user_id)})
+    principal_cache.invalidate(user_id)
+    permission_versions.revoke_all(user_id)
 
+    # Widgets store their owner as the string id
     from core.database import widgets_collection
-    await widgets_collection.delete_many({"owner": ObjectId(user_id)})
+    from models.widget_counter import delete_counts
+    from models.widget_revision import bump_revision
+    await widgets_collection.delete_many({"owner": user_id})
+    await delete_counts(user_id)
+    await bump_revision(user_id)
 
     return result.deleted_count == 1
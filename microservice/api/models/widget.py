@@ -1,8 +1,32 @@
+import asyncio
+from collections import Counter
 from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator
+
 from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import ValidationError
+from pymongo import DeleteOne, InsertOne, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, PyMongoError
 
 from core.database import widgets_collection
-from schemas.widget import WidgetCreate, Widget, WidgetUpdate
+from core.indexes import check_query_plan
+from models.widget_counter import adjust_counts, get_count
+from models.widget_revision import bump_revision
+from schemas.widget import WidgetCreate, Widget, WidgetUpdate, BulkOperation, WidgetBulkItem, WidgetBulkItemResult, \
+    WidgetBulkResponse, WidgetImportError, WidgetImportReport
+from utils.importing import Row
+from utils.documents import from_document
+from utils.etag import VersionConflict, version_filter
+from utils.pagination import keyset_filter, keyset_sort
+from utils.projection import partial_model, projection
+
+
+async def _widgets_changed(owner_id: str, deltas: Counter | None = None) -> None:
+    """Invalidate everything derived from an owner's widgets after a write."""
+    await adjust_counts(owner_id, deltas or Counter())
+    # Bumped last, so whoever reads the new revision also reads the new counts
+    await bump_revision(owner_id)
 
 
 async def create_widget(widget: WidgetCreate, owner_id: str) -> Widget:
@@ -10,9 +34,11 @@ async def create_widget(widget: WidgetCreate, owner_id: str) -> Widget:
     widget_dict = widget.model_dump()
     widget_dict["owner"] = owner_id
     widget_dict["created_at"] = datetime.now(timezone.utc)
+    widget_dict["version"] = 0
 
     result = await widgets_collection.insert_one(widget_dict)
     widget_dict["_id"] = result.inserted_id
+    await _widgets_changed(owner_id, Counter([widget_dict["category"]]))
 
     return Widget.model_validate(widget_dict)
 
@@ -22,58 +48,348 @@ async def get_widgets(
         skip: int = 0,
         limit: int = 100,
         category: str | None = None,
+        after: str | None = None,
+        fields: tuple[str, ...] | None = None,
 ) -> list[Widget]:
-    """Get widgets by owner with optional filtering"""
+    """Get widgets by owner with optional filtering, in _id order.
+
+    `after` is a pagination cursor; pages fetched with it are index range
+    scans, so deep pages cost the same as the first one. Only `fields` are
+    loaded and returned when given.
+    """
+    query = {"owner": owner_id}
+    if category:
+        query["category"] = category
+    if after:
+        query.update(keyset_filter(after))
+
+    await check_query_plan(widgets_collection, query, keyset_sort())
+    model = partial_model(Widget, fields)
+    cursor = widgets_collection.find(query, projection(Widget, fields)).sort(keyset_sort()).skip(skip).limit(limit)
+    return [from_document(model, widget) async for widget in cursor]
+
+
+async def iter_widgets(
+        owner_id: str,
+        category: str | None = None,
+        batch_size: int = 1000,
+) -> AsyncIterator[Widget]:
+    """Iterate over all widgets of an owner in _id order, fetching `batch_size` at a time."""
     query = {"owner": owner_id}
     if category:
         query["category"] = category
 
-    cursor = widgets_collection.find(query).skip(skip).limit(limit)
-    return [Widget.model_validate(widget) async for widget in cursor]
+    await check_query_plan(widgets_collection, query, keyset_sort())
+    cursor = widgets_collection.find(query).sort(keyset_sort()).batch_size(batch_size)
+    try:
+        async for widget in cursor:
+            yield from_document(Widget, widget)
+    finally:
+        await cursor.close()
 
 
-async def get_widget(widget_id: str, owner_id: str) -> Widget | None:
-    """Get a widget by id and owner"""
-    widget = await widgets_collection.find_one({"_id": ObjectId(widget_id), "owner": owner_id})
+async def get_widget(widget_id: str, owner_id: str, fields: tuple[str, ...] | None = None) -> Widget | None:
+    """Get a widget by id and owner, loading only `fields` when given"""
+    query = {"_id": ObjectId(widget_id), "owner": owner_id}
+    await check_query_plan(widgets_collection, query)
+    widget = await widgets_collection.find_one(query, projection(Widget, fields))
     if widget:
-        return Widget.model_validate(widget)
+        return from_document(partial_model(Widget, fields), widget)
     return None
 
 
+async def get_widget_version(widget_id: str, owner_id: str) -> int | None:
+    """Get the version of a widget by id and owner without loading the widget"""
+    widget = await widgets_collection.find_one({"_id": ObjectId(widget_id), "owner": owner_id}, {"version": 1})
+    if widget:
+        return widget.get("version", 0)
+    return None
+
+
+async def _check_version(widget_id: str, owner_id: str) -> None:
+    """Tell a missing widget from a version mismatch after a versioned write matched nothing."""
+    if await get_widget_version(widget_id, owner_id) is not None:
+        raise VersionConflict("Widget was modified")
+
+
 async def update_widget(
         widget_id: str,
         owner_id: str,
-        widget: WidgetUpdate
+        widget: WidgetUpdate,
+        version: int | None = None,
 ) -> Widget | None:
-    """Update a widget by id and owner"""
+    """Update a widget by id and owner.
+
+    With `version`, only a widget still at that version is updated;
+    VersionConflict is raised if it moved on.
+    """
     update_data = {k: v for k, v in widget.model_dump().items() if v is not None}
 
+    query = {"_id": ObjectId(widget_id), "owner": owner_id}
+    if version is not None:
+        query.update(version_filter(version))
+
     if not update_data:
-        return await get_widget(widget_id, owner_id)
+        widget = await widgets_collection.find_one(query)
+        if widget is None and version is not None:
+            await _check_version(widget_id, owner_id)
+        return from_document(Widget, widget) if widget else None
 
     update_data["updated_at"] = datetime.now(timezone.utc)
 
-    result = await widgets_collection.update_one(
-        {"_id": ObjectId(widget_id), "owner": owner_id},
-        {"$set": update_data}
+    # Take the document before the update, which carries the old category for
+    # the counters, and apply the update locally instead of reading it again
+    previous = await widgets_collection.find_one_and_update(
+        query,
+        {"$set": update_data, "$inc": {"version": 1}},
+        return_document=ReturnDocument.BEFORE,
     )
 
-    if result.modified_count == 0:
+    if previous is None:
+        if version is not None:
+            await _check_version(widget_id, owner_id)
         return None
 
-    return await get_widget(widget_id, owner_id)
+    deltas = Counter()
+    if update_data.get("category", previous["category"]) != previous["category"]:
+        deltas.update({previous["category"]: -1, update_data["category"]: 1})
+    await _widgets_changed(owner_id, deltas)
+
+    return from_document(Widget, {**previous, **update_data, "version": previous.get("version", 0) + 1})
 
 
-async def delete_widget(widget_id: str, owner_id: str) -> bool:
-    """Delete a widget by id and owner"""
-    result = await widgets_collection.delete_one({"_id": ObjectId(widget_id), "owner": owner_id})
-    return result.deleted_count == 1
+async def delete_widget(widget_id: str, owner_id: str, version: int | None = None) -> bool:
+    """Delete a widget by id and owner, with `version` only while it is at that version"""
+    query = {"_id": ObjectId(widget_id), "owner": owner_id}
+    if version is not None:
+        query.update(version_filter(version))
+
+    deleted = await widgets_collection.find_one_and_delete(query, projection={"category": 1})
+    if deleted is None:
+        if version is not None:
+            await _check_version(widget_id, owner_id)
+        return False
+
+    await _widgets_changed(owner_id, Counter({deleted["category"]: -1}))
+    return True
 
 
 async def count_widgets(owner_id: str, category: str | None = None) -> int:
-    """Count widgets by owner with optional filtering"""
-    query = {"owner": owner_id}
-    if category:
-        query["category"] = category
+    """Count widgets by owner with optional filtering, from the materialized counters"""
+    return await get_count(owner_id, category)
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'widget'}: {e['msg']}" for e in error.errors())
+
+
+async def bulk_write_widgets(
+        owner_id: str,
+        operations: list[WidgetBulkItem],
+        ordered: bool = True,
+) -> WidgetBulkResponse:
+    """Create, update and delete widgets of an owner in a single bulk write.
+
+    Each operation is validated on its own and reported in the result at its
+    index. With `ordered`, the first failed operation stops all later ones.
+    """
+    now = datetime.now(timezone.utc)
+    results = [WidgetBulkItemResult(index=index, op=item.op) for index, item in enumerate(operations)]
+    prepared: list[tuple[int, InsertOne | UpdateOne | DeleteOne | None]] = []
+    targets: dict[int, ObjectId] = {}
+    # Category each successful operation adds a widget to
+    new_categories: dict[int, str] = {}
+
+    for index, item in enumerate(operations):
+        result = results[index]
+        try:
+            if item.op == BulkOperation.CREATE:
+                widget_dict = WidgetCreate.model_validate(item.widget or {}).model_dump()
+                widget_dict.update({"_id": ObjectId(), "owner": owner_id, "created_at": now, "version": 0})
+                result.id = str(widget_dict["_id"])
+                new_categories[index] = widget_dict["category"]
+                prepared.append((index, InsertOne(widget_dict)))
+                continue
+
+            if item.id is None:
+                raise ValueError("id: Field required")
+            widget_id = targets[index] = ObjectId(item.id)
+            result.id = item.id
+            query = {"_id": widget_id, "owner": owner_id}
+
+            if item.op == BulkOperation.DELETE:
+                prepared.append((index, DeleteOne(query)))
+                continue
+
+            update = WidgetUpdate.model_validate(item.widget or {}).model_dump()
+            update_data = {k: v for k, v in update.items() if v is not None}
+            if update_data:
+                update_data["updated_at"] = now
+                if "category" in update_data:
+                    new_categories[index] = update_data["category"]
+                prepared.append((index, UpdateOne(query, {"$set": update_data, "$inc": {"version": 1}})))
+            else:
+                prepared.append((index, None))
+        except ValidationError as e:
+            result.error = _format_validation_error(e)
+        except (InvalidId, ValueError) as e:
+            result.error = str(e)
+
+        if ordered and result.error:
+            break
+
+    existing: dict[ObjectId, str] = {}
+    if targets:
+        cursor = widgets_collection.find(
+            {"_id": {"$in": list(set(targets.values()))}, "owner": owner_id},
+            projection={"_id": 1, "category": 1},
+        )
+        existing = {widget["_id"]: widget["category"] async for widget in cursor}
+        for index, widget_id in targets.items():
+            if widget_id not in existing:
+                results[index].error = "Widget not found"
+
+    # A widget deleted by an earlier operation no longer exists for the ones after it
+    deleted: set[ObjectId] = set()
+    for index, _ in prepared:
+        if results[index].error or index not in targets:
+            continue
+        if targets[index] in deleted:
+            results[index].error = "Widget deleted earlier in the batch"
+        elif operations[index].op == BulkOperation.DELETE:
+            deleted.add(targets[index])
+
+    # Drop operations that failed the checks above, and with `ordered` everything after them
+    first_failure = next((result.index for result in results if result.error), None)
+    requests = []
+    request_indexes = []
+    for index, request in prepared:
+        if results[index].error or (ordered and first_failure is not None and index > first_failure):
+            continue
+        if request is None:
+            results[index].ok = True
+            continue
+        requests.append(request)
+        request_indexes.append(index)
+
+    failed_requests: dict[int, str] = {}
+    if requests:
+        try:
+            await widgets_collection.bulk_write(requests, ordered=ordered)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed_requests[error["index"]] = error.get("errmsg", "Write failed")
+            if ordered and failed_requests:
+                first_failure = request_indexes[min(failed_requests)]
+        except PyMongoError:
+            # Some operations may have been applied
+            await _widgets_changed(owner_id)
+            raise
+
+    for position, index in enumerate(request_indexes):
+        if position in failed_requests:
+            results[index].error = failed_requests[position]
+        elif not (ordered and first_failure is not None and index > first_failure):
+            results[index].ok = True
+
+    # Replay successful operations in order, so that several operations on one widget add up
+    deltas = Counter()
+    for result in results:
+        if not result.ok:
+            continue
+        if result.op == BulkOperation.DELETE or (result.op == BulkOperation.UPDATE and result.index in new_categories):
+            deltas[existing[targets[result.index]]] -= 1
+        if result.index in new_categories:
+            deltas[new_categories[result.index]] += 1
+            if result.op == BulkOperation.UPDATE:
+                existing[targets[result.index]] = new_categories[result.index]
+    if requests:
+        await _widgets_changed(owner_id, deltas)
+
+    response = WidgetBulkResponse(results=results)
+    for result in results:
+        if not result.ok:
+            result.error = result.error or "Not executed after an earlier failure"
+            response.failed += 1
+        elif result.op == BulkOperation.CREATE:
+            response.created += 1
+        elif result.op == BulkOperation.UPDATE:
+            response.updated += 1
+        else:
+            response.deleted += 1
+    return response
+
+
+async def import_widgets(
+        owner_id: str,
+        rows: AsyncIterable[Row],
+        batch_size: int = 1000,
+        max_errors: int = 1000,
+) -> WidgetImportReport:
+    """Validate parsed rows and insert them as widgets of an owner in micro-batches.
+
+    While one batch is being written, the next one is parsed and validated,
+    so at most two batches are held in memory however large the input is.
+    """
+    report = WidgetImportReport()
+
+    def add_error(row_number: int, error: str) -> None:
+        report.failed += 1
+        if len(report.errors) < max_errors:
+            report.errors.append(WidgetImportError(row=row_number, error=error))
+        else:
+            report.errors_truncated = True
+
+    async def insert(batch: list[tuple[int, dict]]) -> None:
+        failed = set()
+        try:
+            result = await widgets_collection.insert_many([widget for _, widget in batch], ordered=False)
+            report.imported += len(result.inserted_ids)
+        except BulkWriteError as e:
+            report.imported += e.details.get("nInserted", 0)
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                add_error(batch[error["index"]][0], error.get("errmsg", "Write failed"))
+        except PyMongoError:
+            # Some widgets may have been inserted
+            await _widgets_changed(owner_id)
+            raise
+        await _widgets_changed(
+            owner_id,
+            Counter(widget["category"] for position, (_, widget) in enumerate(batch) if position not in failed),
+        )
+
+    batch: list[tuple[int, dict]] = []
+    pending: asyncio.Task | None = None
+    now = datetime.now(timezone.utc)
+    try:
+        async for row_number, fields, error in rows:
+            report.received += 1
+            if error is None:
+                try:
+                    widget_dict = WidgetCreate.model_validate(fields).model_dump()
+                except ValidationError as e:
+                    error = _format_validation_error(e)
+            if error is not None:
+                add_error(row_number, error)
+                continue
+
+            widget_dict.update({"owner": owner_id, "created_at": now, "version": 0})
+            batch.append((row_number, widget_dict))
+            if len(batch) >= batch_size:
+                if pending is not None:
+                    await pending
+                pending = asyncio.create_task(insert(batch))
+                batch = []
+
+        if pending is not None:
+            await pending
+            pending = None
+        if batch:
+            await insert(batch)
+    finally:
+        if pending is not None:
+            pending.cancel()
 
-    return await widgets_collection.count_documents(query)
+    report.errors.sort(key=lambda e: e.row)
+    return report
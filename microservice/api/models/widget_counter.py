@@ -0,0 +1,97 @@
+from collections import Counter
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from core.database import widget_counters_collection, widgets_collection
+from core.indexes import check_query_plan
+
+# Counter documents are {"owner", "category", "count"}, unique by (owner, category)
+# The counter with a null category holds the owner's total across categories
+TOTAL = None
+
+
+async def adjust_counts(owner_id: str, deltas: Counter[str]) -> None:
+    """Add per-category deltas to the widget counters of an owner, and their sum to the total."""
+    deltas = Counter({**deltas, TOTAL: sum(deltas.values())})
+    requests = [
+        UpdateOne({"owner": owner_id, "category": category}, {"$inc": {"count": delta}}, upsert=True)
+        for category, delta in deltas.items() if delta
+    ]
+    if not requests:
+        return
+
+    try:
+        await widget_counters_collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        # Concurrent upserts of a new counter race on the unique index; by now
+        # the counter exists, so the failed increments can simply be retried
+        retry = [requests[error["index"]] for error in e.details.get("writeErrors", []) if error.get("code") == 11000]
+        if len(retry) != len(e.details.get("writeErrors", [])):
+            raise
+        await widget_counters_collection.bulk_write(retry, ordered=False)
+
+
+async def get_count(owner_id: str, category: str | None = None) -> int:
+    """Get the number of widgets of an owner, optionally in one category."""
+    query = {"owner": owner_id, "category": category or TOTAL}
+    await check_query_plan(widget_counters_collection, query)
+    counter = await widget_counters_collection.find_one(query, {"count": 1})
+    return max(counter["count"], 0) if counter else 0
+
+
+async def get_category_counts(owner_id: str) -> dict[str, int]:
+    """Get the number of widgets of an owner in each of their categories."""
+    query = {"owner": owner_id, "category": {"$ne": TOTAL}, "count": {"$gt": 0}}
+    await check_query_plan(widget_counters_collection, query)
+    cursor = widget_counters_collection.find(query, {"_id": 0, "category": 1, "count": 1}).sort("category", 1)
+    return {counter["category"]: counter["count"] async for counter in cursor}
+
+
+async def delete_counts(owner_id: str) -> None:
+    """Drop all counters of an owner."""
+    await widget_counters_collection.delete_many({"owner": owner_id})
+
+
+async def reconcile_counters(owner_id: str | None = None) -> dict:
+    """Rebuild the counters from the widgets themselves and report the ones that drifted.
+
+    Writes that land while the aggregation runs may be reported as drift and
+    are then corrected by the next run.
+    """
+    match = {"owner": owner_id} if owner_id else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": {"owner": "$owner", "category": "$category"}, "count": {"$sum": 1}}},
+    ]
+    expected = {
+        (group["_id"]["owner"], group["_id"]["category"]): group["count"]
+        async for group in await widgets_collection.aggregate(pipeline, allowDiskUse=True)
+    }
+    totals = Counter()
+    for (owner, _), count in expected.items():
+        totals[owner] += count
+    expected.update({(owner, TOTAL): count for owner, count in totals.items()})
+
+    drifted = []
+    requests = []
+    checked = 0
+    async for counter in widget_counters_collection.find(match):
+        checked += 1
+        key = (counter["owner"], counter["category"])
+        count = expected.pop(key, 0)
+        if counter["count"] == count:
+            continue
+        drifted.append({"owner": key[0], "category": key[1], "counted": counter["count"], "actual": count})
+        if count:
+            requests.append(UpdateOne({"_id": counter["_id"]}, {"$set": {"count": count}}))
+        else:
+            requests.append(DeleteOne({"_id": counter["_id"]}))
+
+    for (owner, category), count in expected.items():
+        drifted.append({"owner": owner, "category": category, "counted": 0, "actual": count})
+        requests.append(UpdateOne({"owner": owner, "category": category}, {"$set": {"count": count}}, upsert=True))
+
+    if requests:
+        await widget_counters_collection.bulk_write(requests, ordered=False)
+    return {"checked": checked, "corrected": len(requests), "drifted": drifted}
@@ -0,0 +1,14 @@
+from core.database import widget_revisions_collection
+
+# Revision documents are {"_id": owner id, "revision": n}, bumped after every widget write of the owner
+
+
+async def bump_revision(owner_id: str) -> None:
+    await widget_revisions_collection.update_one({"_id": owner_id}, {"$inc": {"revision": 1}}, upsert=True)
+
+
+async def get_revision(owner_id: str) -> int:
+    """Get the revision of an owner's widgets, 0 before their first write."""
+    revision = await widget_revisions_collection.find_one({"_id": owner_id})
+    return revision["revision"] if revision else 0
+
@@ -0,0 +1,66 @@
+from core.cache import TTLCache
+from core.config import settings
+from core.database import widgets_collection
+from core.heap import register_structure
+from models.widget_revision import get_revision
+from schemas.widget import WidgetCategoryStats, WidgetInventoryStats, WidgetStats
+
+stats_cache: TTLCache[str, tuple[int, WidgetInventoryStats]] = TTLCache(
+    settings.WIDGET_STATS_CACHE_MAX_SIZE,
+    settings.WIDGET_STATS_CACHE_TTL_SECONDS,
+)
+register_structure("widget_stats", stats_cache)
+
+
+async def aggregate_inventory_stats(owner_id: str) -> WidgetInventoryStats:
+    """Compute inventory totals of an owner per category with a $group pipeline."""
+    pipeline = [
+        {"$match": {"owner": owner_id}},
+        {"$group": {
+            "_id": "$category",
+            "count": {"$sum": 1},
+            "total_quantity": {"$sum": "$quantity"},
+            "total_value": {"$sum": {"$multiply": ["$price", "$quantity"]}},
+            "total_price": {"$sum": "$price"},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+
+    categories = []
+    totals = WidgetStats()
+    total_price = 0.0
+    async for group in await widgets_collection.aggregate(pipeline):
+        categories.append(WidgetCategoryStats(
+            category=group["_id"],
+            count=group["count"],
+            total_quantity=group["total_quantity"],
+            total_value=group["total_value"],
+            min_price=group["min_price"],
+            max_price=group["max_price"],
+            avg_price=group["total_price"] / group["count"],
+        ))
+        totals.count += group["count"]
+        totals.total_quantity += group["total_quantity"]
+        totals.total_value += group["total_value"]
+        total_price += group["total_price"]
+
+    if categories:
+        totals.min_price = min(category.min_price for category in categories)
+        totals.max_price = max(category.max_price for category in categories)
+        totals.avg_price = total_price / totals.count
+    return WidgetInventoryStats(totals=totals, categories=categories)
+
+
+async def get_inventory_stats(owner_id: str) -> WidgetInventoryStats:
+    """Get inventory totals of an owner, cached until their widgets change."""
+    # Read the revision first, so a write that lands during the aggregation leaves the entry stale
+    revision = await get_revision(owner_id)
+    entry = stats_cache.get(owner_id, lambda cached: cached[0] == revision)
+    if entry is not None:
+        return entry[1]
+
+    stats = await aggregate_inventory_stats(owner_id)
+    stats_cache.set(owner_id, (revision, stats))
+    return stats
@@ -39,6 +39,10 @@ class UserBase(BaseModel):
     email: EmailStr
     username: str
 
+
+class UserInput(UserBase):
+    """Base schema for user data sent by clients, sanitized before it is stored"""
+
     @model_validator(mode='before')
     @classmethod
     def validate_model(cls, data: Any) -> Any:
@@ -47,13 +51,13 @@ class UserBase(BaseModel):
         return data
 
 
-class UserCreate(UserBase):
+class UserCreate(UserInput):
     """Schema for creating a user"""
     password: str
     role: Role = Role.USER
 
 
-class UserUpdate(UserBase):
+class UserUpdate(UserInput):
     """Schema for updating a user"""
     username: str | None = None
     email: EmailStr | None = None
@@ -62,6 +66,7 @@ class UserUpdate(UserBase):
 
 class User(UserBase):
     """Schema for a user"""
+    # No sanitizing validator: stored users were sanitized when written
     model_config = ConfigDict(
         from_attributes=True,
         populate_by_name=True,
@@ -73,6 +78,8 @@ class User(UserBase):
     role: Role = Role.USER
     permissions: list[Permission] = []
     disabled: bool = False
+    permissions_version: int = Field(default=0, exclude=True)
+    version: int = Field(default=0, exclude=True)
 
     @field_serializer("id")
     def serialize_id(self, value: ObjectId) -> str:
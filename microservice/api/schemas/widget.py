@@ -1,5 +1,6 @@
 from datetime import datetime
 from decimal import Decimal
+from enum import Enum
 from typing import Any
 
 from bson import ObjectId
@@ -17,6 +18,10 @@ class WidgetBase(BaseModel):
     quantity: PositiveInt
     category: str
 
+
+class WidgetInput(WidgetBase):
+    """Base schema for widget data sent by clients, sanitized before it is stored"""
+
     @model_validator(mode='before')
     @classmethod
     def validate_model(cls, data: Any) -> Any:
@@ -26,12 +31,12 @@ class WidgetBase(BaseModel):
         return data
 
 
-class WidgetCreate(WidgetBase):
+class WidgetCreate(WidgetInput):
     """Schema for creating a widget"""
     pass
 
 
-class WidgetUpdate(WidgetBase):
+class WidgetUpdate(WidgetInput):
     """Schema for updating a widget"""
     name: str | None = Field(default=None, description="Name of the widget")
     description: str | None = None
@@ -42,6 +47,7 @@ class WidgetUpdate(WidgetBase):
 
 class Widget(WidgetBase):
     """Schema for a widget"""
+    # No sanitizing validator: stored widgets were sanitized when written
     model_config = ConfigDict(
         from_attributes=True,
         populate_by_name=True,
@@ -65,7 +71,85 @@ class Widget(WidgetBase):
     owner: str
     created_at: datetime
     updated_at: datetime | None = None
+    version: int = Field(default=0, exclude=True)
 
     @field_serializer("id")
     def serialize_id(self, value: ObjectId) -> str:
         return str(value)
+
+
+class BulkOperation(str, Enum):
+    """Operations of a bulk widget request"""
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+class WidgetBulkItem(BaseModel):
+    """Schema for one operation of a bulk widget request"""
+    op: BulkOperation
+    id: str | None = Field(default=None, description="ID of the widget to update or delete")
+    widget: dict[str, Any] | None = Field(
+        default=None,
+        description="Widget fields, validated as WidgetCreate for create and WidgetUpdate for update",
+    )
+
+
+class WidgetBulkRequest(BaseModel):
+    """Schema for a bulk widget request"""
+    operations: list[WidgetBulkItem]
+    ordered: bool = Field(default=True, description="Stop at the first failed operation")
+
+
+class WidgetBulkItemResult(BaseModel):
+    """Schema for the outcome of one bulk operation"""
+    index: int
+    op: BulkOperation
+    id: str | None = None
+    ok: bool = False
+    error: str | None = None
+
+
+class WidgetBulkResponse(BaseModel):
+    """Schema for the outcome of a bulk widget request"""
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    failed: int = 0
+    results: list[WidgetBulkItemResult]
+
+
+class WidgetImportError(BaseModel):
+    """Schema for a rejected row of a widget import"""
+    row: int
+    error: str
+
+
+class WidgetImportReport(BaseModel):
+    """Schema for the outcome of a widget import"""
+    received: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: list[WidgetImportError] = []
+    errors_truncated: bool = False
+
+
+class WidgetStats(BaseModel):
+    """Schema for inventory totals of a set of widgets"""
+    count: int = 0
+    total_quantity: int = 0
+    total_value: float = Field(default=0.0, description="Sum of price * quantity")
+    min_price: float | None = None
+    max_price: float | None = None
+    avg_price: float | None = None
+
+
+class WidgetCategoryStats(WidgetStats):
+    """Schema for inventory totals of one category"""
+    category: str
+
+
+class WidgetInventoryStats(BaseModel):
+    """Schema for inventory totals of an owner, overall and per category"""
+    totals: WidgetStats
+    categories: list[WidgetCategoryStats]
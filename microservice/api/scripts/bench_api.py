@@ -0,0 +1,374 @@
+"""Load-benchmark the API in process and compare the results with a baseline.
+
+Drives the real `main.app` through an ASGI transport against seeded data,
+either in the in-memory stand-in of scripts.mongo_standin (the default) or
+in a throwaway database on a real server given with --mongo-uri, which is
+dropped afterwards. Every scenario reports requests per second and latency
+percentiles; results are written as JSON, and with --baseline the run fails
+when a scenario got slower than --threshold allows.
+
+The stand-in skips the driver, BSON and command monitoring and cannot
+aggregate (see scripts.mongo_standin), so its runs exclude database costs
+and are only comparable with other stand-in runs.
+
+    python -m scripts.bench_api --output bench.json
+    python -m scripts.bench_api --baseline bench.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, NamedTuple
+
+import httpx
+from bson import ObjectId
+
+CATEGORIES = [f"category {n}" for n in range(10)]
+PASSWORD = "bench-password"
+# GET, PATCH and DELETE /widgets/{id} and /widgets/count do not resolve the caller
+# yet and act on the widgets of this owner, so it is seeded like a user
+UNRESOLVED_OWNER = "abc"
+
+
+class Scenario(NamedTuple):
+    name: str
+    # Sends one request with the client and a random generator, returns the response
+    send: Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+    # Scenarios hashing passwords are much slower, so they run fewer requests
+    slow: bool = False
+
+
+class Fixture:
+    """Seeded users and widgets, with a token per user."""
+
+    def __init__(self) -> None:
+        self.users: list[dict] = []
+        self.tokens: dict[str, str] = {}
+        self.widgets: dict[str, list[str]] = {}
+
+    def headers(self, username: str) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[username]}"}
+
+    def pick(self, rng: random.Random) -> tuple[str, dict[str, str]]:
+        user = rng.choice(self.users)
+        return user["_id"], self.headers(user["username"])
+
+
+def install_standin(latency: float) -> None:
+    """Swap the stand-in collections into core.database before any model module imports them."""
+    if "models.widget" in sys.modules:
+        raise RuntimeError("The stand-in must be installed before the app is imported")
+
+    import core.database as database
+    from scripts.mongo_standin import MemoryCollection
+
+    database.users_collection = MemoryCollection(
+        "users", indexed=("username", "email"), unique=[("username",), ("email",)], latency=latency,
+    )
+    database.widgets_collection = MemoryCollection("widgets", indexed=("owner",), latency=latency)
+    database.widget_counters_collection = MemoryCollection(
+        "widget_counters", indexed=("owner",), unique=[("owner", "category")], latency=latency,
+    )
+    database.widget_revisions_collection = MemoryCollection("widget_revisions", latency=latency)
+
+
+async def seed(users: int, widgets_per_user: int, rng: random.Random) -> Fixture:
+    from core.database import users_collection, widgets_collection
+    from core.rbac import create_user_claims, get_permissions_for_role
+    from core.security import create_access_token, get_password_hash
+    from models.widget_counter import adjust_counts
+    from schemas.user import Role, User
+
+    fixture = Fixture()
+    # bcrypt is deliberately slow; every user shares one hash
+    password = get_password_hash(PASSWORD)
+    now = datetime.now(timezone.utc)
+
+    async def seed_widgets(owner_id: str) -> None:
+        widgets = [
+            {
+                "_id": ObjectId(),
+                "name": f"widget {n}",
+                "description": "A widget seeded for the load benchmark",
+                "price": round(rng.uniform(1, 100), 2),
+                "quantity": rng.randint(1, 1000),
+                "category": rng.choice(CATEGORIES),
+                "owner": owner_id,
+                "created_at": now,
+                "version": 0,
+            }
+            for n in range(widgets_per_user)
+        ]
+        if widgets:
+            await widgets_collection.insert_many(widgets)
+            await adjust_counts(owner_id, Counter(widget["category"] for widget in widgets))
+        fixture.widgets[owner_id] = [str(widget["_id"]) for widget in widgets]
+
+    await seed_widgets(UNRESOLVED_OWNER)
+    for n in range(users):
+        # Managers may create and update widgets
+        user = {
+            "_id": ObjectId(),
+            "username": f"bench{n}",
+            "email": f"bench{n}@example.com",
+            "password": password,
+            "role": Role.MANAGER,
+            "permissions": get_permissions_for_role(Role.MANAGER),
+            "disabled": False,
+            "version": 0,
+        }
+        await users_collection.insert_one(dict(user))
+        fixture.users.append({"_id": str(user["_id"]), "username": user["username"]})
+        fixture.tokens[user["username"]] = create_access_token(create_user_claims(User.model_validate(user)))
+        await seed_widgets(str(user["_id"]))
+    return fixture
+
+
+def scenarios(fixture: Fixture, page_size: int) -> list[Scenario]:
+    async def token(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        user = rng.choice(fixture.users)
+        return await client.post("/token", data={"username": user["username"], "password": PASSWORD})
+
+    async def list_widgets(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        owner, headers = fixture.pick(rng)
+        pages = max(1, len(fixture.widgets[owner]) // page_size)
+        params = {"skip": rng.randrange(pages) * page_size, "limit": page_size}
+        return await client.get("/widgets/", params=params, headers=headers)
+
+    async def read_widget(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        _, headers = fixture.pick(rng)
+        return await client.get(f"/widgets/{rng.choice(fixture.widgets[UNRESOLVED_OWNER])}", headers=headers)
+
+    async def create_widget(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        owner, headers = fixture.pick(rng)
+        widget = {
+            "name": f"widget {uuid.uuid4().hex[:8]}",
+            "description": "A widget created by the load benchmark",
+            "price": round(rng.uniform(1, 100), 2),
+            "quantity": rng.randint(1, 1000),
+            "category": rng.choice(CATEGORIES),
+        }
+        response = await client.post("/widgets/", json=widget, headers=headers)
+        if response.status_code == 201:
+            fixture.widgets[owner].append(response.json()["_id"])
+        return response
+
+    async def update_widget(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        _, headers = fixture.pick(rng)
+        changes = {"quantity": rng.randint(1, 1000), "price": round(rng.uniform(1, 100), 2)}
+        widget_id = rng.choice(fixture.widgets[UNRESOLVED_OWNER])
+        return await client.patch(f"/widgets/{widget_id}", json=changes, headers=headers)
+
+    async def read_me(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        _, headers = fixture.pick(rng)
+        return await client.get("/users/me", headers=headers)
+
+    async def count_widgets(client: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        _, headers = fixture.pick(rng)
+        params = {"category": rng.choice(CATEGORIES)} if rng.random() < 0.5 else {}
+        return await client.get("/widgets/count", params=params, headers=headers)
+
+    return [
+        Scenario("POST /token", token, slow=True),
+        Scenario("GET /widgets/", list_widgets),
+        Scenario("GET /widgets/{id}", read_widget),
+        Scenario("POST /widgets/", create_widget),
+        Scenario("PATCH /widgets/{id}", update_widget),
+        Scenario("GET /users/me", read_me),
+        Scenario("GET /widgets/count", count_widgets),
+    ]
+
+
+def percentile(latencies: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted latencies."""
+    index = min(len(latencies) - 1, max(0, round(fraction * len(latencies)) - 1))
+    return latencies[index]
+
+
+async def run_scenario(
+        client: httpx.AsyncClient,
+        scenario: Scenario,
+        requests: int,
+        warmup: int,
+        concurrency: int,
+        seed: int,
+) -> dict:
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        await scenario.send(client, rng)
+
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await scenario.send(client, rng)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """List the scenarios whose throughput dropped or p95 latency grew by more than `threshold`."""
+    regressions = []
+    for name, result in results["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        if result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: {result['rps']:,.1f} requests/s, baseline {base['rps']:,.1f}")
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms, baseline {base['p95_ms']:.2f} ms")
+    return regressions
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict | None) -> None:
+    print(f"{'scenario':<22}{'requests/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'vs base':>10}")
+    for name, result in results["scenarios"].items():
+        change = ""
+        if baseline and name in baseline["scenarios"]:
+            change = f"{result['rps'] / baseline['scenarios'][name]['rps'] - 1:+.1%}"
+        errors = sum(result["errors"].values())
+        print(
+            f"{name:<22}{result['rps']:>12,.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+            f"{result['p99_ms']:>10.2f}{errors:>8}{change:>10}"
+        )
+
+
+async def main_() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--widgets-per-user", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=1_000, help="Measured requests per scenario")
+    parser.add_argument("--slow-requests", type=int, default=40, help="Measured requests of password scenarios")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenario", action="append", help="Only run scenarios whose name contains this")
+    parser.add_argument("--mongo-uri", help="Benchmark against a real server instead of the in-memory stand-in")
+    parser.add_argument("--mongo-latency-ms", type=float, default=0.0, help="Simulated round trip of the stand-in")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Tolerated slowdown against the baseline")
+    args = parser.parse_args()
+
+    # Settings are read at import, so configure the database before importing the app
+    database_name = None
+    if args.mongo_uri:
+        database_name = f"widget_bench_{uuid.uuid4().hex[:8]}"
+        os.environ["MONGO_URI"] = args.mongo_uri
+        os.environ["MONGO_DB_NAME"] = database_name
+    else:
+        install_standin(args.mongo_latency_ms / 1000)
+
+    import main
+    from core.config import settings
+    from core.database import client
+    from core.indexes import reconcile_indexes
+
+    settings.RATE_LIMIT_ANON_REQUESTS = settings.RATE_LIMIT_AUTH_REQUESTS = 10 ** 9
+
+    try:
+        if database_name:
+            await reconcile_indexes()
+        fixture = await seed(args.users, args.widgets_per_user, random.Random(args.seed))
+
+        selected = [
+            scenario for scenario in scenarios(fixture, args.page_size)
+            if not args.scenario or any(part in scenario.name for part in args.scenario)
+        ]
+        results = {
+            "meta": {
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "database": "mongod" if database_name else "standin",
+                "config": {
+                    "users": args.users,
+                    "widgets_per_user": args.widgets_per_user,
+                    "concurrency": args.concurrency,
+                    "page_size": args.page_size,
+                    "mongo_latency_ms": args.mongo_latency_ms,
+                    "response_cache": settings.RESPONSE_CACHE_ENABLED,
+                    "stateless_auth": settings.STATELESS_AUTH,
+                },
+            },
+            "scenarios": {},
+        }
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api.example.com") as http:
+            for index, scenario in enumerate(selected):
+                requests = args.slow_requests if scenario.slow else args.requests
+                results["scenarios"][scenario.name] = await run_scenario(
+                    http, scenario, requests, args.warmup, args.concurrency, args.seed + index,
+                )
+    finally:
+        if database_name:
+            await client.drop_database(database_name)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    print_results(results, baseline)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    failed = [name for name, result in results["scenarios"].items() if result["errors"]]
+    for name in failed:
+        print(f"{name} had failing requests: {results['scenarios'][name]['errors']}", file=sys.stderr)
+
+    if baseline:
+        if baseline["meta"]["config"] != results["meta"]["config"]:
+            print("The baseline was recorded with a different configuration", file=sys.stderr)
+        if baseline["meta"]["database"] != results["meta"]["database"]:
+            print(f"The baseline was recorded on {baseline['meta']['database']}, not this run's "
+                  f"{results['meta']['database']}", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression over {args.threshold:.0%}: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_()))
@@ -0,0 +1,120 @@
+"""Compare GET /widgets/ throughput at limit=100 with and without the revalidation-free read path.
+
+The collection is replaced by an in-memory stand-in returning the same 100
+documents, so only model building and serialization differ between runs.
+
+    python -m scripts.bench_list_endpoint --requests 2000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import httpx
+from bson import ObjectId
+from fastapi import Depends
+
+import main
+import models.widget
+import models.widget_revision
+from core.config import settings
+from core.rbac import get_current_active_user, require_permission
+from schemas.user import User, Role, Permission
+from schemas.widget import Widget
+
+
+class StubCursor:
+    def __init__(self, documents: list[dict]) -> None:
+        self.documents = documents
+
+    def sort(self, *args, **kwargs) -> "StubCursor":
+        return self
+
+    def skip(self, *args) -> "StubCursor":
+        return self
+
+    def limit(self, *args) -> "StubCursor":
+        return self
+
+    async def __aiter__(self):
+        for document in self.documents:
+            # Like the driver, hand out a fresh document every time
+            yield dict(document)
+
+
+class StubCollection:
+    def __init__(self, documents: list[dict]) -> None:
+        self.documents = documents
+
+    def find(self, *args, **kwargs) -> StubCursor:
+        return StubCursor(self.documents)
+
+    async def find_one(self, *args, **kwargs) -> dict | None:
+        return None
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int) -> float:
+    for _ in range(20):
+        (await client.get(path)).raise_for_status()
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        (await client.get(path)).raise_for_status()
+    return requests / (time.perf_counter() - start)
+
+
+async def main_() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2_000)
+    args = parser.parse_args()
+
+    settings.RATE_LIMIT_ANON_REQUESTS = settings.RATE_LIMIT_AUTH_REQUESTS = 10 ** 9
+    # Measure building and serializing the page, not the response cache
+    settings.RESPONSE_CACHE_ENABLED = False
+    user = User(_id=ObjectId(), email="bench@example.com", username="bench", role=Role.ADMIN)
+    now = datetime.now(timezone.utc)
+    documents = [
+        {
+            "_id": ObjectId(),
+            "name": f"widget {n}",
+            "description": "A widget used for benchmarking the list endpoint",
+            "price": 9.99,
+            "quantity": n + 1,
+            "category": f"category {n % 5}",
+            "owner": str(user.id),
+            "created_at": now,
+        }
+        for n in range(100)
+    ]
+    models.widget.widgets_collection = StubCollection(documents)
+    models.widget_revision.widget_revisions_collection = StubCollection([])
+
+    app = main.app
+    app.dependency_overrides[get_current_active_user] = lambda: user
+
+    @app.get(
+        "/bench/validated-widgets",
+        response_model=list[Widget],
+        dependencies=[Depends(require_permission(Permission.READ_WIDGET))],
+    )
+    async def validated_widgets(
+            skip: int = 0,
+            limit: int = 10,
+            current_user: User = Depends(get_current_active_user),
+    ):
+        """The previous read path: validate every document, then let FastAPI validate and serialize."""
+        cursor = models.widget.widgets_collection.find({"owner": str(current_user.id)}).skip(skip).limit(limit)
+        return [Widget.model_validate(document) async for document in cursor]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api.example.com") as client:
+        before = await measure(client, "/bench/validated-widgets?limit=100", args.requests)
+        after = await measure(client, "/widgets/?limit=100", args.requests)
+
+    print(f"{'read path':<22}{'requests/s':>12}")
+    print(f"{'validated':<22}{before:>12,.0f}")
+    print(f"{'trusted documents':<22}{after:>12,.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main_())
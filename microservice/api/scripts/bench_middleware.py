@@ -0,0 +1,162 @@
+"""Compare requests/sec of the ASGI middleware stack against the old BaseHTTPMiddleware one.
+
+Authentication, the widget query and the revision lookup are stubbed out,
+and the response cache is off, so that only the middleware and routing
+overhead is measured.
+
+    python -m scripts.bench_middleware --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI, Request, Response, status
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import api.widgets
+import models.widget_revision
+from api import routers
+from core.config import settings
+from core.middleware import add_middleware
+from core.rate_limit import RateLimiter
+from core.rbac import get_current_active_user
+from schemas.user import User, Role
+from schemas.widget import Widget
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app: FastAPI) -> None:
+        super().__init__(app)
+        self.limiter = RateLimiter()
+
+    async def dispatch(self, request: Request, call_next: Callable):
+        token = None
+        auth_header = request.headers.get("Authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            token = auth_header[7:]
+
+        is_limited, headers = self.limiter.is_rate_limited(request.client.host, token)
+        if is_limited:
+            return Response(
+                content='{"detail": "Too many requests"}',
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                media_type="application/json",
+                headers=headers
+            )
+
+        response = await call_next(request)
+        for key, value in headers.items():
+            response.headers[key] = value
+        return response
+
+
+class LegacyEnvMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: Callable):
+        host = request.headers.get("host", "")
+        if "dev" in host:
+            env, debug = "dev", True
+        elif "uat" in host:
+            env, debug = "uat", True
+        elif "cert" in host:
+            env, debug = "cert", False
+        else:
+            env, debug = "prod", False
+
+        os.environ["ENV"] = env
+        os.environ["DEBUG"] = str(debug)
+        return await call_next(request)
+
+
+def add_legacy_middleware(app: FastAPI) -> None:
+    app.add_middleware(LegacyEnvMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.CORS_ALLOW_ORIGINS,
+        allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
+        allow_methods=settings.CORS_ALLOW_METHODS,
+        allow_headers=settings.CORS_ALLOW_HEADERS,
+        max_age=settings.CORS_MAX_AGE,
+    )
+    app.add_middleware(LegacyRateLimitMiddleware)
+
+
+def build_app(install_middleware: Callable[[FastAPI], None]) -> FastAPI:
+    app = FastAPI()
+    install_middleware(app)
+    for router in routers:
+        app.include_router(router)
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    user = User(_id=ObjectId(), email="bench@example.com", username="bench", role=Role.ADMIN)
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    return app
+
+
+class StubRevisions:
+    async def find_one(self, *args, **kwargs) -> dict | None:
+        return None
+
+
+async def stub_get_widgets(
+        owner_id: str,
+        skip: int = 0,
+        limit: int = 100,
+        category: str | None = None,
+        after: str | None = None,
+        fields: tuple[str, ...] | None = None,
+):
+    now = datetime.now(timezone.utc)
+    return [
+        Widget(_id=ObjectId(), name=f"widget {n}", price=1.0, quantity=1, category="bench", owner=owner_id,
+               created_at=now)
+        for n in range(limit)
+    ]
+
+
+async def measure(app: FastAPI, path: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app, client=("10.0.0.1", 1234))
+    headers = {"Authorization": "Bearer bench", "Host": "api.example.com"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://api.example.com") as client:
+        async def worker(count: int) -> None:
+            for _ in range(count):
+                response = await client.get(path, headers=headers)
+                response.raise_for_status()
+
+        await worker(50)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+        return requests // concurrency * concurrency / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    settings.RATE_LIMIT_ANON_REQUESTS = settings.RATE_LIMIT_AUTH_REQUESTS = 10 ** 9
+    # Measure the middleware on every request, not the response cache
+    settings.RESPONSE_CACHE_ENABLED = False
+    api.widgets.get_widgets = stub_get_widgets
+    models.widget_revision.widget_revisions_collection = StubRevisions()
+
+    apps = {"BaseHTTPMiddleware": build_app(add_legacy_middleware), "ASGI": build_app(add_middleware)}
+
+    print(f"{'path':<18}{'stack':<20}{'requests/s':>12}")
+    for path in ("/health", "/widgets/"):
+        for name, app in apps.items():
+            rps = await measure(app, path, args.requests, args.concurrency)
+            print(f"{path:<18}{name:<20}{rps:>12,.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
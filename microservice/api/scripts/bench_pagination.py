@@ -0,0 +1,78 @@
+"""Compare deep-page latency of skip/limit and cursor pagination of widget listings.
+
+Needs a reachable MongoDB (MONGO_URI); seeds widgets for a throwaway owner
+and removes them afterwards.
+
+    python -m scripts.bench_pagination --widgets 100000 --limit 100
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+from core.database import widgets_collection
+from core.indexes import reconcile_indexes
+from models.widget import get_widgets
+from utils.pagination import next_cursor
+
+
+async def seed(owner_id: str, count: int) -> None:
+    now = datetime.now(timezone.utc)
+    batch = []
+    for n in range(count):
+        batch.append({
+            "name": f"widget {n}",
+            "description": "benchmark widget",
+            "price": 1.0,
+            "quantity": 1,
+            "category": f"category {n % 10}",
+            "owner": owner_id,
+            "created_at": now,
+        })
+        if len(batch) == 10_000:
+            await widgets_collection.insert_many(batch)
+            batch = []
+    if batch:
+        await widgets_collection.insert_many(batch)
+
+
+async def timed(coroutine) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = await coroutine
+    return (time.perf_counter() - start) * 1000, result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--widgets", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    owner_id = f"bench-{uuid.uuid4().hex}"
+    await reconcile_indexes()
+    await seed(owner_id, args.widgets)
+
+    try:
+        pages = args.widgets // args.limit
+        probes = sorted({0, 1, 10, 100, 1_000, pages // 2, pages - 1} & set(range(pages)))
+
+        # Walk the cursor chain once to collect the cursor of every probed page
+        cursors = {0: None}
+        after = None
+        for page in range(1, max(probes) + 1):
+            widgets = await get_widgets(owner_id, 0, args.limit, after=after)
+            after = next_cursor(widgets, args.limit)
+            cursors[page] = after
+
+        print(f"{'page':>8}{'skip ms':>12}{'cursor ms':>12}")
+        for page in probes:
+            skip_ms, _ = await timed(get_widgets(owner_id, page * args.limit, args.limit))
+            cursor_ms, _ = await timed(get_widgets(owner_id, 0, args.limit, after=cursors[page]))
+            print(f"{page:>8}{skip_ms:>12.2f}{cursor_ms:>12.2f}")
+    finally:
+        await widgets_collection.delete_many({"owner": owner_id})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
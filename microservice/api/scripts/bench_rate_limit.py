@@ -0,0 +1,90 @@
+"""Measure per-request rate limiter overhead for each backend.
+
+    python -m scripts.bench_rate_limit --requests 200000 --clients 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+
+from core.config import settings
+from core.rate_limit import MemoryBackend, RateLimiter
+from core.rate_limit.network import NetworkStoreBackend
+from core.rate_limit.shared_memory import SharedMemoryBackend
+from core.rate_limit.store import RateLimitStore
+
+
+def start_store() -> int:
+    """Run a stand-in rate limit store on an ephemeral port in a background thread."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    store = RateLimitStore(settings.RATE_LIMIT_MAX_KEYS)
+    thread = threading.Thread(target=asyncio.run, args=(store.serve("127.0.0.1", port),), daemon=True)
+    thread.start()
+
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    return port
+
+
+def run(limiter: RateLimiter, requests: list[tuple[str, str | None]]) -> float:
+    """Return the mean cost of one rate limit check in microseconds."""
+    start = time.perf_counter()
+    for ip, token in requests:
+        limiter.is_rate_limited(ip, token)
+    return (time.perf_counter() - start) / len(requests) * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=1_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    requests = [
+        (f"10.0.{n // 256}.{n % 256}", f"token-{n}" if n % 2 else None)
+        for n in (rng.randrange(args.clients) for _ in range(args.requests))
+    ]
+
+    window = settings.RATE_LIMIT_WINDOW_SECONDS
+    max_keys = settings.RATE_LIMIT_MAX_KEYS
+    port = start_store()
+    shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    shm_path = os.path.join(shm_dir, f"widget-api-bench-{os.getpid()}")
+
+    backends = {
+        "memory": lambda namespace: MemoryBackend(window, max_keys),
+        "shared_memory": lambda namespace: SharedMemoryBackend(
+            f"{shm_path}-{namespace}", window, settings.RATE_LIMIT_SHM_SLOTS, settings.RATE_LIMIT_SHM_STRIPES,
+        ),
+        "network": lambda namespace: NetworkStoreBackend(
+            "127.0.0.1", port, window, max_keys, settings.RATE_LIMIT_STORE_FLUSH_SECONDS, f"{namespace}:",
+        ),
+    }
+
+    print(f"{'backend':<15}{'us/request':>12}{'requests/s':>14}")
+    for name, factory in backends.items():
+        limiter = RateLimiter(factory("ip"), factory("token"))
+        try:
+            cost = run(limiter, requests)
+        finally:
+            limiter.close()
+        print(f"{name:<15}{cost:>12.2f}{1_000_000 / cost:>14,.0f}")
+
+    for namespace in ("ip", "token"):
+        os.unlink(f"{shm_path}-{namespace}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""In-memory stand-in for the MongoDB collections used by the API, for benchmarks without a mongod.
+
+Supports the subset of the async collection API and of the query and
+update languages that the models use. Equality lookups on `indexed` fields
+and on _id go through a hash index; everything else scans. Documents are
+copied on the way in and out, like the driver encodes and decodes BSON.
+
+The collections are swapped in at the Python level, not behind the wire
+protocol. pymongo's connection pool, BSON encoding and command monitoring
+are therefore never exercised, and CommandMetrics records nothing.
+Aggregations raise NotImplementedError, so /widgets/stats and counter
+reconciliation cannot run on it. Timings measure the app's own overhead;
+use a real server for end-to-end numbers.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Iterable
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+
+
+def _clone(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    return value
+
+
+def _get(document: dict, path: str) -> Any:
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if value is _MISSING:
+        return expected is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _compare(value: Any, expected: Any, operator: str) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if operator == "$gt":
+            return value > expected
+        if operator == "$gte":
+            return value >= expected
+        if operator == "$lt":
+            return value < expected
+        return value <= expected
+    except TypeError:
+        return False
+
+
+def _matches_condition(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return _equals(value, condition)
+
+    for operator, expected in condition.items():
+        if operator in ("$gt", "$gte", "$lt", "$lte"):
+            matched = _compare(value, expected, operator)
+        elif operator == "$ne":
+            matched = not _equals(value, expected)
+        elif operator == "$in":
+            matched = any(_equals(value, item) for item in expected)
+        elif operator == "$nin":
+            matched = not any(_equals(value, item) for item in expected)
+        elif operator == "$exists":
+            matched = (value is not _MISSING) == bool(expected)
+        else:
+            raise NotImplementedError(f"Query operator {operator} is not supported by the stand-in")
+        if not matched:
+            return False
+    return True
+
+
+def matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif not _matches_condition(_get(document, key), condition):
+            return False
+    return True
+
+
+def project(document: dict, projection: dict | list | None) -> dict:
+    if not projection:
+        return _clone(document)
+    if isinstance(projection, list):
+        projection = dict.fromkeys(projection, 1)
+
+    include_id = projection.get("_id", 1)
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        result = {field: _clone(document[field]) for field in included if field in document}
+        if include_id and "_id" in document:
+            result["_id"] = document["_id"]
+        return result
+
+    excluded = {field for field, flag in projection.items() if not flag}
+    return {field: _clone(value) for field, value in document.items() if field not in excluded}
+
+
+def _sort_key(value: Any) -> tuple:
+    # Order across types roughly like BSON: missing and null, numbers, strings, then the rest
+    if value is _MISSING or value is None:
+        return 0, 0
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return 1, value
+    if isinstance(value, str):
+        return 2, value
+    if isinstance(value, ObjectId):
+        return 3, value.binary
+    return 4, value
+
+
+def apply_update(document: dict, update: dict, inserting: bool = False) -> None:
+    for operator, fields in update.items():
+        for field, value in fields.items():
+            if operator == "$set" or (operator == "$setOnInsert" and inserting):
+                document[field] = _clone(value)
+            elif operator == "$setOnInsert":
+                continue
+            elif operator == "$unset":
+                document.pop(field, None)
+            elif operator == "$inc":
+                document[field] = document.get(field, 0) + value
+            elif operator == "$addToSet":
+                items = document.setdefault(field, [])
+                if value not in items:
+                    items.append(_clone(value))
+            elif operator == "$pull":
+                document[field] = [item for item in document.get(field, []) if item != value]
+            else:
+                raise NotImplementedError(f"Update operator {operator} is not supported by the stand-in")
+
+
+class MemoryCursor:
+    def __init__(self, collection: "MemoryCollection", query: dict, projection: dict | list | None) -> None:
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self._sort: list[tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list: str | list[tuple[str, int]], direction: int = 1) -> "MemoryCursor":
+        self._sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, skip: int) -> "MemoryCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "MemoryCursor":
+        return self
+
+    async def close(self) -> None:
+        pass
+
+    async def __aiter__(self):
+        await self.collection.round_trip()
+        documents = list(self.collection.select(self.query))
+        for field, direction in reversed(self._sort):
+            documents.sort(key=lambda document: _sort_key(_get(document, field)), reverse=direction < 0)
+        end = self._skip + self._limit if self._limit else None
+        for document in documents[self._skip:end]:
+            yield project(document, self.projection)
+
+
+class MemoryCollection:
+    """Async collection keeping its documents in a dict by _id.
+
+    `unique` lists field tuples that must be unique, like the declared
+    unique indexes; violations raise DuplicateKeyError. `latency` adds a
+    simulated round trip to every operation.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            indexed: Iterable[str] = (),
+            unique: Iterable[tuple[str, ...]] = (),
+            latency: float = 0.0,
+    ) -> None:
+        self.name = name
+        self.latency = latency
+        self.unique = list(unique)
+        self._documents: dict[Any, dict] = {}
+        self._indexes: dict[str, defaultdict[Any, dict[Any, None]]] = {field: defaultdict(dict) for field in indexed}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    async def round_trip(self) -> None:
+        # Always yield to the event loop, like a real round trip does
+        await asyncio.sleep(self.latency)
+
+    def select(self, query: dict) -> Iterable[dict]:
+        if "_id" in query and not isinstance(query["_id"], dict):
+            document = self._documents.get(query["_id"])
+            candidates = [document] if document is not None else []
+        else:
+            candidates = None
+            for field, index in self._indexes.items():
+                value = query.get(field, _MISSING)
+                if value is not _MISSING and not isinstance(value, dict):
+                    candidates = [self._documents[key] for key in index.get(value, ())]
+                    break
+            if candidates is None:
+                candidates = list(self._documents.values())
+        return (document for document in candidates if matches(document, query))
+
+    def _find_first(self, query: dict) -> dict | None:
+        return next(iter(self.select(query)), None)
+
+    def _index(self, document: dict) -> None:
+        for field, index in self._indexes.items():
+            value = document.get(field, _MISSING)
+            if value is not _MISSING:
+                index[value][document["_id"]] = None
+
+    def _unindex(self, document: dict) -> None:
+        for field, index in self._indexes.items():
+            value = document.get(field, _MISSING)
+            if value is not _MISSING:
+                index[value].pop(document["_id"], None)
+
+    def _check_unique(self, document: dict, ignore_id: Any = _MISSING) -> None:
+        for fields in self.unique:
+            key = tuple(document.get(field) for field in fields)
+            for other in self._documents.values():
+                if other["_id"] != ignore_id and tuple(other.get(field) for field in fields) == key:
+                    raise DuplicateKeyError(
+                        f"E11000 duplicate key error collection: {self.name} dup key: {dict(zip(fields, key))}",
+                        11000,
+                        {"keyValue": dict(zip(fields, key))},
+                    )
+
+    def _insert(self, document: dict) -> Any:
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._documents:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+        self._check_unique(document)
+        stored = _clone(document)
+        self._documents[stored["_id"]] = stored
+        self._index(stored)
+        return stored["_id"]
+
+    def _update(self, document: dict, update: dict, inserting: bool = False) -> None:
+        self._unindex(document)
+        updated = _clone(document)
+        apply_update(updated, update, inserting)
+        try:
+            self._check_unique(updated, ignore_id=document["_id"])
+        except DuplicateKeyError:
+            self._index(document)
+            raise
+        document.clear()
+        document.update(updated)
+        self._index(document)
+
+    def _upsert(self, query: dict, update: dict) -> dict:
+        document = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+        apply_update(document, update, inserting=True)
+        self._insert(document)
+        return self._documents[document["_id"]]
+
+    def _delete(self, document: dict) -> None:
+        self._unindex(document)
+        del self._documents[document["_id"]]
+
+    def find(self, query: dict | None = None, projection: dict | list | None = None, **kwargs) -> MemoryCursor:
+        return MemoryCursor(self, query or {}, projection)
+
+    async def find_one(self, query: dict | None = None, projection: dict | list | None = None, **kwargs) -> dict | None:
+        await self.round_trip()
+        document = self._find_first(query or {})
+        return project(document, projection) if document is not None else None
+
+    async def count_documents(self, query: dict, **kwargs) -> int:
+        await self.round_trip()
+        return sum(1 for _ in self.select(query))
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        await self.round_trip()
+        # Like the driver, add the generated _id to the caller's document
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        await self.round_trip()
+        return InsertManyResult([self._insert(document) for document in documents], True)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        await self.round_trip()
+        document = self._find_first(query)
+        if document is not None:
+            self._update(document, update)
+            return UpdateResult({"n": 1, "nModified": 1}, True)
+        if upsert:
+            inserted = self._upsert(query, update)
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": inserted["_id"]}, True)
+        return UpdateResult({"n": 0, "nModified": 0}, True)
+
+    async def find_one_and_update(
+            self,
+            query: dict,
+            update: dict,
+            projection: dict | list | None = None,
+            upsert: bool = False,
+            return_document: bool = ReturnDocument.BEFORE,
+            **kwargs,
+    ) -> dict | None:
+        await self.round_trip()
+        document = self._find_first(query)
+        if document is None:
+            if not upsert:
+                return None
+            document = self._upsert(query, update)
+            return project(document, projection) if return_document == ReturnDocument.AFTER else None
+
+        before = project(document, projection)
+        self._update(document, update)
+        return project(document, projection) if return_document == ReturnDocument.AFTER else before
+
+    async def find_one_and_delete(self, query: dict, projection: dict | list | None = None, **kwargs) -> dict | None:
+        await self.round_trip()
+        document = self._find_first(query)
+        if document is None:
+            return None
+        self._delete(document)
+        return project(document, projection)
+
+    async def delete_one(self, query: dict, **kwargs) -> DeleteResult:
+        await self.round_trip()
+        document = self._find_first(query)
+        if document is not None:
+            self._delete(document)
+        return DeleteResult({"n": int(document is not None)}, True)
+
+    async def delete_many(self, query: dict, **kwargs) -> DeleteResult:
+        await self.round_trip()
+        documents = list(self.select(query))
+        for document in documents:
+            self._delete(document)
+        return DeleteResult({"n": len(documents)}, True)
+
+    async def bulk_write(self, requests: list, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        await self.round_trip()
+        counts = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0, "upserted": []}
+        for request in requests:
+            if isinstance(request, InsertOne):
+                self._insert(request._doc)
+                counts["nInserted"] += 1
+            elif isinstance(request, (UpdateOne, UpdateMany)):
+                documents = list(self.select(request._filter))
+                if isinstance(request, UpdateOne):
+                    documents = documents[:1]
+                for document in documents:
+                    self._update(document, request._doc)
+                counts["nMatched"] += len(documents)
+                counts["nModified"] += len(documents)
+                if not documents and request._upsert:
+                    self._upsert(request._filter, request._doc)
+                    counts["nUpserted"] += 1
+            elif isinstance(request, (DeleteOne, DeleteMany)):
+                documents = list(self.select(request._filter))
+                if isinstance(request, DeleteOne):
+                    documents = documents[:1]
+                for document in documents:
+                    self._delete(document)
+                counts["nRemoved"] += len(documents)
+            else:
+                raise NotImplementedError(f"{type(request).__name__} is not supported by the stand-in")
+        return BulkWriteResult(counts, True)
+
+    async def aggregate(self, pipeline: list[dict], **kwargs):
+        raise NotImplementedError("Aggregations are not supported by the stand-in, use --mongo-uri")
@@ -0,0 +1,26 @@
+"""Rebuild the materialized widget counters from the widgets and report drift.
+
+Run it once after deploying the counters to backfill them, and whenever the
+counters are suspected to be off.
+
+    python -m scripts.reconcile_widget_counters [--owner OWNER_ID]
+"""
+import argparse
+import asyncio
+
+from models.widget_counter import reconcile_counters
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--owner", help="Only reconcile the counters of this owner")
+    args = parser.parse_args()
+
+    report = await reconcile_counters(args.owner)
+    for drift in report["drifted"]:
+        print(f"{drift['owner']} {drift['category']!r}: counted {drift['counted']}, actual {drift['actual']}")
+    print(f"Checked {report['checked']} counters, corrected {report['corrected']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
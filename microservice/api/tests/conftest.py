@@ -0,0 +1,5 @@
+import os
+
+# Settings require the certificate paths, which the tests never open
+os.environ.setdefault("SSL_KEYFILE", "key.pem")
+os.environ.setdefault("SSL_CERTFILE", "cert.pem")
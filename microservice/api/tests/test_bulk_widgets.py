@@ -0,0 +1,155 @@
+import asyncio
+from collections import Counter
+
+import pytest
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne
+from pymongo.errors import BulkWriteError
+
+import models.widget
+from models.widget import bulk_write_widgets
+from schemas.widget import WidgetBulkItem
+
+OWNER = "owner"
+WIDGET = {"name": "Gear", "price": 1.5, "quantity": 2, "category": "tools"}
+
+
+class FakeWidgets:
+    """Widgets collection applying bulk writes in memory, failing the writes of chosen ids."""
+
+    def __init__(self, docs: list[dict], fail: set[ObjectId] = frozenset()) -> None:
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.fail = fail
+
+    def find(self, query: dict, projection: dict | None = None):
+        async def cursor():
+            for doc in list(self.docs.values()):
+                if doc["_id"] in query["_id"]["$in"] and doc["owner"] == query["owner"]:
+                    yield doc
+        return cursor()
+
+    async def bulk_write(self, requests: list, ordered: bool = True) -> None:
+        errors = []
+        for position, request in enumerate(requests):
+            widget_id = request._doc["_id"] if isinstance(request, InsertOne) else request._filter["_id"]
+            if widget_id in self.fail:
+                errors.append({"index": position, "errmsg": "Write failed"})
+                if ordered:
+                    break
+            elif isinstance(request, InsertOne):
+                self.docs[widget_id] = request._doc
+            elif isinstance(request, DeleteOne):
+                self.docs.pop(widget_id, None)
+            elif widget_id in self.docs:
+                self.docs[widget_id].update(request._doc["$set"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+@pytest.fixture
+def widgets(monkeypatch):
+    ids = [ObjectId(), ObjectId()]
+    collection = FakeWidgets([{"_id": widget_id, "owner": OWNER, **WIDGET} for widget_id in ids])
+    deltas = Counter()
+
+    async def widgets_changed(owner_id, changes=None):
+        deltas.update(changes or Counter())
+
+    monkeypatch.setattr(models.widget, "widgets_collection", collection)
+    monkeypatch.setattr(models.widget, "_widgets_changed", widgets_changed)
+    return collection, ids, deltas
+
+
+def bulk(operations: list[dict], ordered: bool):
+    items = [WidgetBulkItem.model_validate(operation) for operation in operations]
+    return asyncio.run(bulk_write_widgets(OWNER, items, ordered=ordered))
+
+
+def outcomes(response) -> list[tuple[bool, str | None]]:
+    return [(result.ok, result.error) for result in response.results]
+
+
+def mixed_operations(ids: list[ObjectId]) -> list[dict]:
+    return [
+        {"op": "create", "widget": {**WIDGET, "category": "toys"}},
+        {"op": "update", "id": str(ids[0]), "widget": {"category": "toys"}},
+        {"op": "delete", "id": str(ObjectId())},
+        {"op": "delete", "id": str(ids[1])},
+    ]
+
+
+def test_ordered_stops_at_first_failure(widgets):
+    collection, ids, deltas = widgets
+
+    response = bulk(mixed_operations(ids), ordered=True)
+
+    assert outcomes(response) == [
+        (True, None),
+        (True, None),
+        (False, "Widget not found"),
+        (False, "Not executed after an earlier failure"),
+    ]
+    assert (response.created, response.updated, response.deleted, response.failed) == (1, 1, 0, 2)
+    assert ids[1] in collection.docs
+    assert deltas == Counter({"toys": 2, "tools": -1})
+
+
+def test_unordered_runs_operations_after_failure(widgets):
+    collection, ids, deltas = widgets
+
+    response = bulk(mixed_operations(ids), ordered=False)
+
+    assert outcomes(response) == [(True, None), (True, None), (False, "Widget not found"), (True, None)]
+    assert (response.created, response.updated, response.deleted, response.failed) == (1, 1, 1, 1)
+    assert ids[1] not in collection.docs
+    assert deltas == Counter({"toys": 2, "tools": -2})
+
+
+def test_validation_errors_are_reported_at_their_index(widgets):
+    _, ids, _ = widgets
+
+    response = bulk([
+        {"op": "update", "id": str(ids[0]), "widget": {"quantity": 0}},
+        {"op": "update", "id": "not-an-id", "widget": {"name": "Cog"}},
+        {"op": "delete"},
+    ], ordered=False)
+
+    assert response.failed == 3
+    assert response.results[0].error.startswith("quantity: ")
+    assert "not a valid ObjectId" in response.results[1].error
+    assert response.results[2].error == "id: Field required"
+
+
+@pytest.mark.parametrize("ordered, last", [
+    (True, (False, "Not executed after an earlier failure")),
+    (False, (True, None)),
+])
+def test_write_errors_are_reported_per_operation(widgets, ordered, last):
+    collection, ids, deltas = widgets
+    collection.fail = {ids[0]}
+
+    response = bulk([
+        {"op": "update", "id": str(ids[1]), "widget": {"name": "Cog"}},
+        {"op": "delete", "id": str(ids[0])},
+        {"op": "update", "id": str(ids[1]), "widget": {"category": "toys"}},
+    ], ordered=ordered)
+
+    assert outcomes(response) == [(True, None), (False, "Write failed"), last]
+    assert ids[0] in collection.docs
+    assert deltas == (Counter() if ordered else Counter({"toys": 1, "tools": -1}))
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_operations_after_delete_of_same_widget_fail(widgets, ordered):
+    _, ids, deltas = widgets
+
+    response = bulk([
+        {"op": "delete", "id": str(ids[0])},
+        {"op": "update", "id": str(ids[0]), "widget": {"category": "toys"}},
+        {"op": "delete", "id": str(ids[0])},
+    ], ordered=ordered)
+
+    assert response.results[0].ok
+    assert response.results[1].error == "Widget deleted earlier in the batch"
+    assert response.deleted == 1
+    assert deltas == Counter({"tools": -1})
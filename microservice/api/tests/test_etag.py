@@ -0,0 +1,40 @@
+import pytest
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from utils.etag import VersionConflict, document_etag, etag_matches, if_match_version
+
+DOCUMENT_ID = ObjectId()
+
+
+def test_if_match_returns_version_of_document_etag():
+    assert if_match_version(document_etag(DOCUMENT_ID, 3), str(DOCUMENT_ID)) == 3
+    assert if_match_version(f'"other-1", {document_etag(DOCUMENT_ID, 4)}', str(DOCUMENT_ID)) == 4
+    assert if_match_version("*", str(DOCUMENT_ID)) is None
+    assert if_match_version(None, str(DOCUMENT_ID)) is None
+
+
+def test_if_match_compares_canonical_ids():
+    assert if_match_version(document_etag(DOCUMENT_ID, 2), str(DOCUMENT_ID).upper()) == 2
+
+
+def test_if_match_uses_strong_comparison():
+    with pytest.raises(VersionConflict):
+        if_match_version(f"W/{document_etag(DOCUMENT_ID, 2)}", str(DOCUMENT_ID))
+
+
+def test_if_match_rejects_etags_of_other_documents():
+    with pytest.raises(VersionConflict):
+        if_match_version(document_etag(ObjectId(), 2), str(DOCUMENT_ID))
+
+
+def test_if_match_raises_invalid_id():
+    with pytest.raises(InvalidId):
+        if_match_version(document_etag(DOCUMENT_ID, 2), "not-an-id")
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = document_etag(DOCUMENT_ID, 1)
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(document_etag(DOCUMENT_ID, 2), etag)
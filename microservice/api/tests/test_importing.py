@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from utils.importing import csv_rows, iter_lines
+
+
+async def stream(chunks: list[bytes]):
+    for chunk in chunks:
+        yield chunk
+
+
+def chunked(data: bytes, size: int) -> list[bytes]:
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def collect(rows) -> list:
+    async def run():
+        return [row async for row in rows]
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 64])
+def test_iter_lines_across_chunk_boundaries(size):
+    data = b"first\nsecond line\n\nlast"
+
+    lines = collect(iter_lines(stream(chunked(data, size)), max_line_bytes=64))
+
+    assert lines == [b"first", b"second line", b"", b"last"]
+
+
+def test_iter_lines_without_trailing_data():
+    assert collect(iter_lines(stream([b"a\nb\n"]), max_line_bytes=8)) == [b"a", b"b"]
+    assert collect(iter_lines(stream([]), max_line_bytes=8)) == []
+
+
+@pytest.mark.parametrize("size", [1, 4, 100])
+def test_iter_lines_skips_oversized_lines(size):
+    data = b"ok\n" + b"x" * 20 + b"\nfine\n" + b"y" * 9
+
+    lines = collect(iter_lines(stream(chunked(data, size)), max_line_bytes=8))
+
+    assert lines == [b"ok", None, b"fine", None]
+
+
+def test_iter_lines_keeps_line_of_exactly_max_bytes():
+    data = b"12345678\n"
+
+    assert collect(iter_lines(stream(chunked(data, 3)), max_line_bytes=8)) == [b"12345678"]
+
+
+@pytest.mark.parametrize("size", [1, 7, 1024])
+def test_csv_rows_with_multiline_quoted_cells(size):
+    data = (
+        b'name,description,price\r\n'
+        b'Gear,"first line\r\nsecond, with comma",1.5\r\n'
+        b'Cog,"says ""hi""\n\nafter a blank line",2\r\n'
+    )
+
+    rows = collect(csv_rows(stream(chunked(data, size)), max_line_bytes=64))
+
+    assert rows == [
+        (1, {"name": "Gear", "description": "first line\r\nsecond, with comma", "price": "1.5"}, None),
+        (2, {"name": "Cog", "description": 'says "hi"\n\nafter a blank line', "price": "2"}, None),
+    ]
+
+
+def test_csv_rows_drops_empty_cells_and_blank_lines():
+    data = b" name , description ,price\n\nGear,,1.5\n\n"
+
+    rows = collect(csv_rows(stream([data]), max_line_bytes=64))
+
+    assert rows == [(1, {"name": "Gear", "price": "1.5"}, None)]
+
+
+def test_csv_rows_reports_bad_rows_and_continues():
+    data = b"name,price\nGear\n" + b"x" * 40 + b"\nCog,2\n"
+
+    rows = collect(csv_rows(stream(chunked(data, 5)), max_line_bytes=16))
+
+    assert rows == [
+        (1, None, "Expected 2 columns, got 1"),
+        (2, None, "Line is too long"),
+        (3, {"name": "Cog", "price": "2"}, None),
+    ]
+
+
+def test_csv_rows_rejects_unterminated_quoted_cell_over_max_bytes():
+    data = b'name,description\nGear,"' + b"line\n" * 10 + b'end"\nCog,ok\n'
+
+    rows = collect(csv_rows(stream(chunked(data, 4)), max_line_bytes=16))
+
+    assert rows[0] == (1, None, "Line is too long")
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import core.indexes
+from core.indexes import INDEXES, MissingIndexError, reconcile_collection, reconcile_indexes
+
+
+class FakeCollection:
+    """Collection with fixed index descriptions that fails to create any when `conflict` is set."""
+
+    def __init__(self, name: str, existing: list[dict], conflict: bool = False) -> None:
+        self.name = name
+        self.existing = existing
+        self.conflict = conflict
+        self.created = []
+
+    async def list_indexes(self):
+        async def cursor():
+            for index in self.existing:
+                yield index
+        return cursor()
+
+    async def create_indexes(self, indexes: list) -> None:
+        if self.conflict:
+            raise OperationFailure("Index already exists with different options")
+        self.created.extend(index.document["name"] for index in indexes)
+
+
+def reconcile(existing: list[dict], conflict: bool = False) -> dict:
+    collection = FakeCollection("users", existing, conflict)
+    return asyncio.run(reconcile_collection(collection, INDEXES["users"]))
+
+
+def test_missing_indexes_are_created():
+    report = reconcile([{"name": "_id_", "key": {"_id": 1}}])
+
+    assert report["created"] == ["username_unique", "email_unique"]
+    assert report["missing"] == report["drifted"] == report["unexpected"] == []
+
+
+def test_equivalent_index_under_another_name_is_drift():
+    report = reconcile([
+        {"name": "username_1", "key": {"username": 1}, "unique": True},
+        {"name": "email_unique", "key": {"email": 1}, "unique": True},
+    ])
+
+    assert report["drifted"] == ["username_unique (exists as username_1)"]
+    assert report["created"] == report["missing"] == report["unexpected"] == []
+
+
+def test_index_with_other_options_is_missing():
+    report = reconcile([
+        {"name": "username_unique", "key": {"username": 1}},
+        {"name": "email_1", "key": {"email": 1}},
+    ], conflict=True)
+
+    assert report["drifted"] == ["username_unique"]
+    assert report["failed"] == ["email_unique"]
+    assert report["missing"] == ["username_unique", "email_unique"]
+    assert report["unexpected"] == ["email_1"]
+
+
+@pytest.mark.parametrize("users, starts", [
+    ([{"name": "username_1", "key": {"username": 1}, "unique": True}], True),
+    ([{"name": "username_unique", "key": {"username": 1}}], False),
+])
+def test_startup_fails_only_without_unique_constraint(monkeypatch, users, starts):
+    collections = {name: FakeCollection(name, []) for name in INDEXES}
+    collections["users"] = FakeCollection("users", users)
+    monkeypatch.setattr(core.indexes, "db", collections)
+
+    if starts:
+        asyncio.run(reconcile_indexes())
+    else:
+        with pytest.raises(MissingIndexError, match="users.username_unique"):
+            asyncio.run(reconcile_indexes())
@@ -0,0 +1,31 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from core.security import PasswordHasher
+
+
+def test_cancelled_call_holds_its_slot_until_the_hash_finishes():
+    hasher = PasswordHasher(workers=1, queue_size=0)
+    release = threading.Event()
+
+    async def run():
+        task = asyncio.create_task(hasher.run(release.wait))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert hasher.in_flight == 1
+        with pytest.raises(HTTPException) as rejected:
+            await hasher.run(len, "")
+        assert rejected.value.status_code == 503
+
+        release.set()
+        await asyncio.to_thread(hasher._executor.submit(len, "").result)
+        assert hasher.in_flight == 0
+        assert await hasher.run(len, "abc") == 3
+
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+from bson import ObjectId
+
+from core.cache import LocalGenerations
+from core.principal_cache import PrincipalCache
+from schemas.user import User
+
+
+def make_user() -> User:
+    return User(id=ObjectId(), username="alice", email="alice@example.com")
+
+
+def test_set_caches_user_looked_up_without_invalidation():
+    cache = PrincipalCache(10, 30, LocalGenerations(64))
+    user = make_user()
+
+    cache.set(user, cache.epoch())
+
+    assert cache.get("alice") is user
+
+
+def test_set_skips_user_invalidated_during_lookup():
+    cache = PrincipalCache(10, 30, LocalGenerations(64))
+    user = make_user()
+
+    epoch = cache.epoch()
+    cache.invalidate(str(user.id))
+    cache.set(user, epoch)
+
+    assert cache.get("alice") is None
+
+
+def test_invalidate_drops_cached_user():
+    cache = PrincipalCache(10, 30, LocalGenerations(64))
+    user = make_user()
+    cache.set(user, cache.epoch())
+
+    cache.invalidate(str(user.id))
+
+    assert cache.get("alice") is None
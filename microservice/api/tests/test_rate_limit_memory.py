@@ -0,0 +1,65 @@
+from core.rate_limit.memory import MemoryBackend
+
+WINDOW = 60
+
+
+def test_hit_counts_until_limit():
+    backend = MemoryBackend(WINDOW, max_keys=10)
+
+    assert [backend.hit("a", 0, limit=3) for _ in range(5)] == [0, 1, 2, 3, 3]
+    # Rejected requests are not counted
+    assert backend.count("a", 1) == 3
+
+
+def test_previous_window_is_weighted_by_overlap():
+    backend = MemoryBackend(WINDOW, max_keys=10)
+    for _ in range(10):
+        backend.increment("a", 30)
+
+    assert backend.count("a", 59) == 10
+    # A quarter into the next window, three quarters of the previous one still overlap
+    assert backend.count("a", WINDOW + 15) == 7
+    assert backend.count("a", 2 * WINDOW - 1) == 0
+
+
+def test_counts_older_than_previous_window_are_dropped():
+    backend = MemoryBackend(WINDOW, max_keys=10)
+    backend.increment("a", 0, amount=10)
+
+    assert backend.count("a", 2 * WINDOW) == 0
+    counter = backend.increment("a", 2 * WINDOW)
+    assert (counter.current, counter.previous) == (1, 0)
+
+
+def test_increment_expires_stale_keys():
+    backend = MemoryBackend(WINDOW, max_keys=10)
+    backend.increment("old", 0)
+    backend.increment("recent", WINDOW)
+
+    backend.increment("new", 2 * WINDOW)
+
+    assert "old" not in backend
+    assert "recent" in backend
+    assert len(backend) == 2
+
+
+def test_least_recently_incremented_key_is_evicted():
+    backend = MemoryBackend(WINDOW, max_keys=2)
+    backend.increment("a", 0)
+    backend.increment("b", 1)
+    backend.increment("a", 2)
+
+    backend.increment("c", 3)
+
+    assert "b" not in backend
+    assert "a" in backend and "c" in backend
+    assert len(backend) == 2
+
+
+def test_evicted_key_starts_over():
+    backend = MemoryBackend(WINDOW, max_keys=1)
+    backend.increment("a", 0, amount=5)
+    backend.increment("b", 1)
+
+    assert backend.count("a", 2) == 0
+    assert backend.hit("a", 2, limit=5) == 0
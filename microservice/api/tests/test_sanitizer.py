@@ -0,0 +1,17 @@
+import nh3
+import pytest
+
+from utils.sanitizer import sanitize_string
+
+
+@pytest.mark.parametrize("value", [
+    "plain text",
+    "\ufeffleading byte order mark",
+    "inner\ufeffbyte order mark",
+    "<b>bold</b> & more",
+    "line\r\nbreak",
+    "non\xa0breaking",
+    "nul\x00byte",
+])
+def test_sanitize_string_matches_nh3(value):
+    assert sanitize_string(value) == nh3.clean(value)
@@ -0,0 +1,32 @@
+import pytest
+
+from core.cache import SharedGenerations, SharedTableMismatch
+from core.rate_limit.shared_memory import SharedMemoryBackend
+
+
+def test_workers_share_an_existing_table(tmp_path):
+    first = SharedGenerations(str(tmp_path / "generations"), 16)
+    second = SharedGenerations(str(tmp_path / "generations"), 16)
+
+    first.bump("key")
+
+    assert second.get("key") == first.get("key") != bytes(8)
+
+
+def test_table_of_another_size_is_not_resized(tmp_path):
+    path = tmp_path / "generations"
+    SharedGenerations(str(path), 16)
+
+    with pytest.raises(SharedTableMismatch):
+        SharedGenerations(str(path), 32)
+    assert path.stat().st_size == 16 * SharedGenerations.SLOT_SIZE
+
+
+def test_table_with_another_header_is_not_reset(tmp_path):
+    path = str(tmp_path / "rate-limit")
+    backend = SharedMemoryBackend(path, window_seconds=60, slots=64, stripes=4)
+    backend.hit("key", 0)
+
+    with pytest.raises(SharedTableMismatch):
+        SharedMemoryBackend(path, window_seconds=30, slots=64, stripes=4)
+    assert backend.hit("key", 1) == 1
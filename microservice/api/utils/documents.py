@@ -0,0 +1,53 @@
+import copy
+from functools import lru_cache, partial
+from typing import Any, Callable, TypeVar
+
+from pydantic import BaseModel
+
+M = TypeVar("M", bound=BaseModel)
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=None)
+def _field_plan(model: type[BaseModel]) -> tuple[tuple[str, str, Any, Callable | None], ...]:
+    """(name, document key, default, default factory) for every field, in declaration order.
+
+    Mutable defaults get a factory copying them, so instances never share them.
+    """
+    plan = []
+    for name, field in model.model_fields.items():
+        default = _MISSING if field.is_required() else field.default
+        factory = field.default_factory
+        if isinstance(default, (list, dict, set)):
+            factory = partial(copy.copy, default)
+        plan.append((name, field.alias or name, default, factory))
+    return tuple(plan)
+
+
+def from_document(model: type[M], document: dict) -> M:
+    """Build a model from a stored document without validating it.
+
+    Documents were validated when they were written, so this only picks the
+    model's fields (by alias) and fills in defaults, like model_construct but
+    without its per-call overhead. Keys that are not fields, such as the
+    password hash, are left out.
+    """
+    values = {}
+    for name, key, default, factory in _field_plan(model):
+        value = document.get(key, _MISSING)
+        if value is _MISSING:
+            if factory is not None:
+                value = factory()
+            elif default is _MISSING:
+                continue
+            else:
+                value = default
+        values[name] = value
+
+    instance = model.__new__(model)
+    object.__setattr__(instance, "__dict__", values)
+    object.__setattr__(instance, "__pydantic_fields_set__", set(values))
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    object.__setattr__(instance, "__pydantic_private__", None)
+    return instance
@@ -0,0 +1,74 @@
+import zlib
+from typing import Any
+
+from bson import ObjectId
+from fastapi import Response, status
+
+ETAG_HEADER = "ETag"
+
+
+class VersionConflict(Exception):
+    """Raised when an If-Match precondition does not hold."""
+
+
+def _checksum(value: str) -> str:
+    return f"{zlib.crc32(value.encode()):08x}"
+
+
+def document_etag(document_id: Any, version: int, fields: tuple[str, ...] | None = None) -> str:
+    """Entity tag of a document at a version, distinct per `fields` projection."""
+    tag = f"{document_id}-{version}"
+    if fields is not None:
+        tag = f"{tag}-{_checksum(','.join(fields))}"
+    return f'"{tag}"'
+
+
+def collection_etag(owner_id: str, revision: int, params: str) -> str:
+    """Entity tag of a listing of an owner's documents at a revision, distinct per listing parameters."""
+    return f'"{revision}-{_checksum(f"{owner_id}?{params}")}"'
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={ETAG_HEADER: etag})
+
+
+def _tags(header: str) -> list[str]:
+    return [tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()]
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches an entity tag (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = _tags(if_none_match)
+    return "*" in tags or etag in tags
+
+
+def if_match_version(if_match: str | None, document_id: Any) -> int | None:
+    """Get the document version an If-Match header requires, None if it requires none.
+
+    Tags are compared strongly, so weak tags never match. The id is compared
+    in its canonical form; InvalidId is raised if it is not an ObjectId, and
+    VersionConflict if none of the tags is one of this document.
+    """
+    if not if_match:
+        return None
+
+    document_id = str(ObjectId(document_id))
+    tags = [tag.strip() for tag in if_match.split(",") if tag.strip()]
+    if "*" in tags:
+        return None
+    for tag in tags:
+        if tag.startswith("W/"):
+            continue
+        parts = tag.strip('"').split("-")
+        if len(parts) >= 2 and parts[0] == document_id and parts[1].isdigit():
+            return int(parts[1])
+    raise VersionConflict("Precondition failed")
+
+
+def version_filter(version: int) -> dict:
+    """Filter matching documents at a version; documents written before versioning count as 0."""
+    if version == 0:
+        return {"version": {"$in": [0, None]}}
+    return {"version": version}
@@ -0,0 +1,39 @@
+import csv
+import io
+from typing import AsyncIterable, AsyncIterator
+
+from pydantic import BaseModel
+
+
+async def ndjson_chunks(items: AsyncIterable[BaseModel], chunk_bytes: int) -> AsyncIterator[bytes]:
+    """Serialize models as newline-delimited JSON, grouped into chunks of about `chunk_bytes`."""
+    buffer = bytearray()
+    async for item in items:
+        buffer += item.model_dump_json(by_alias=True).encode()
+        buffer += b"\n"
+        if len(buffer) >= chunk_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+async def csv_chunks(
+        items: AsyncIterable[BaseModel],
+        fields: list[str],
+        chunk_bytes: int,
+) -> AsyncIterator[bytes]:
+    """Serialize models as CSV rows with a header, grouped into chunks of about `chunk_bytes`."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+
+    async for item in items:
+        row = item.model_dump(mode="json", by_alias=True)
+        writer.writerow([row.get(field) for field in fields])
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
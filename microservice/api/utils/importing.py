@@ -0,0 +1,100 @@
+import csv
+import json
+from typing import Any, AsyncIterable, AsyncIterator
+
+Row = tuple[int, dict[str, Any] | None, str | None]
+
+
+async def iter_lines(stream: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[bytes | None]:
+    """Split a byte stream into lines without holding more than one line in memory.
+
+    Lines longer than `max_line_bytes` are skipped and yielded as None.
+    """
+    buffer = bytearray()
+    oversized = False
+
+    async for chunk in stream:
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            if oversized or len(buffer) + end - start > max_line_bytes:
+                yield None
+            else:
+                buffer += chunk[start:end]
+                yield bytes(buffer)
+            buffer.clear()
+            oversized = False
+            start = end + 1
+
+        if not oversized:
+            buffer += chunk[start:]
+            if len(buffer) > max_line_bytes:
+                buffer.clear()
+                oversized = True
+
+    if oversized:
+        yield None
+    elif buffer:
+        yield bytes(buffer)
+
+
+async def ndjson_rows(stream: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[Row]:
+    """Parse a newline-delimited JSON stream into (row number, fields, error) tuples."""
+    row_number = 0
+    async for line in iter_lines(stream, max_line_bytes):
+        if line is not None and not line.strip():
+            continue
+        row_number += 1
+
+        if line is None:
+            yield row_number, None, "Line is too long"
+            continue
+        try:
+            fields = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(fields, dict):
+            yield row_number, None, "Expected a JSON object"
+            continue
+        yield row_number, fields, None
+
+
+async def csv_rows(stream: AsyncIterable[bytes], max_line_bytes: int) -> AsyncIterator[Row]:
+    """Parse a CSV stream with a header row into (row number, fields, error) tuples.
+
+    Empty cells are left out so that schema defaults apply.
+    """
+    header = None
+    row_number = 0
+    record = ""
+
+    async for line in iter_lines(stream, max_line_bytes):
+        if line is None:
+            record = ""
+            row_number += 1
+            yield row_number, None, "Line is too long"
+            continue
+
+        # A quoted cell may contain newlines; keep reading until quotes are balanced
+        text = line.decode(errors="replace")
+        record = f"{record}\n{text}" if record else text
+        if record.count('"') % 2:
+            if len(record) > max_line_bytes:
+                record = ""
+                row_number += 1
+                yield row_number, None, "Line is too long"
+            continue
+
+        values = next(csv.reader([record.rstrip("\r")]), [])
+        record = ""
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_number, {name: value for name, value in zip(header, values) if value != ""}, None
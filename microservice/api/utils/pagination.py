@@ -0,0 +1,50 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Any
+
+import bson
+from bson.errors import BSONError
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: Any, last_id: bson.ObjectId) -> str:
+    """Encode the position after the last returned document as an opaque cursor."""
+    return urlsafe_b64encode(bson.encode({"k": sort_value, "id": last_id})).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Any, bson.ObjectId]:
+    """Decode a cursor into the sort value and id of the last seen document."""
+    try:
+        position = bson.decode(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_id = position["id"]
+        sort_value = position["k"]
+    except (BSONError, ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(last_id, bson.ObjectId):
+        raise ValueError("Invalid cursor")
+    return sort_value, last_id
+
+
+def keyset_filter(cursor: str, sort_field: str = "_id") -> dict:
+    """Build the range filter selecting documents after a cursor in (sort_field, _id) order."""
+    sort_value, last_id = decode_cursor(cursor)
+    if sort_field == "_id":
+        return {"_id": {"$gt": last_id}}
+    return {"$or": [
+        {sort_field: {"$gt": sort_value}},
+        {sort_field: sort_value, "_id": {"$gt": last_id}},
+    ]}
+
+
+def keyset_sort(sort_field: str = "_id") -> list[tuple[str, int]]:
+    if sort_field == "_id":
+        return [("_id", 1)]
+    return [(sort_field, 1), ("_id", 1)]
+
+
+def next_cursor(items: list, limit: int) -> str | None:
+    """Get the cursor of the page after `items` in _id order, if there may be one."""
+    if len(items) < limit:
+        return None
+    return encode_cursor(items[-1].id, items[-1].id)
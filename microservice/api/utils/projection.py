@@ -0,0 +1,64 @@
+from functools import lru_cache
+
+from pydantic import BaseModel, create_model, field_serializer
+
+
+def public_fields(model: type[BaseModel]) -> dict[str, str]:
+    """Map the serialized name (alias) of every public field of a model to its field name."""
+    return {field.alias or name: name for name, field in model.model_fields.items() if not field.exclude}
+
+
+def parse_fields(model: type[BaseModel], fields: str | None) -> tuple[str, ...] | None:
+    """Parse a comma separated `fields` parameter into field names, in declaration order.
+
+    Fields may be given by their serialized name or field name. The id is
+    always included since pagination cursors are built from it, and so are
+    hidden fields such as versions, which are never serialized.
+    """
+    if fields is None:
+        return None
+
+    public = public_fields(model)
+    names = set(public.values())
+    requested = {"id"} | {name for name, field in model.model_fields.items() if field.exclude}
+    unknown = []
+    for value in fields.split(","):
+        value = value.strip()
+        if not value:
+            continue
+        name = public.get(value, value)
+        if name not in names:
+            unknown.append(value)
+        requested.add(name)
+
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(name for name in model.model_fields if name in requested)
+
+
+def projection(model: type[BaseModel], fields: tuple[str, ...] | None) -> dict[str, int] | None:
+    """Build the Mongo projection loading only `fields` of a model."""
+    if fields is None:
+        return None
+    return {model.model_fields[name].alias or name: 1 for name in fields}
+
+
+@lru_cache(maxsize=512)
+def partial_model(model: type[BaseModel], fields: tuple[str, ...] | None) -> type[BaseModel]:
+    """Get a model with only `fields` of `model`, keeping its config and field serializers."""
+    if fields is None:
+        return model
+
+    definitions = {name: (field.annotation, field) for name, field in model.model_fields.items() if name in fields}
+    serializers = {}
+    for name, decorator in model.__pydantic_decorators__.field_serializers.items():
+        serialized = [field for field in decorator.info.fields if field in fields]
+        if serialized:
+            serializers[name] = field_serializer(*serialized, mode=decorator.info.mode)(decorator.func)
+
+    return create_model(
+        f"Partial{model.__name__}",
+        __config__=model.model_config,
+        __validators__=serializers,
+        **definitions,
+    )
@@ -0,0 +1,24 @@
+from functools import lru_cache
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def get_adapter(tp: Any) -> TypeAdapter:
+    """Get a compiled TypeAdapter for a type, built once per type."""
+    return TypeAdapter(tp)
+
+
+class ModelResponse(Response):
+    """JSON response for models built from trusted database documents.
+
+    The content is serialized once, by alias like FastAPI's response_model
+    serialization, without validating it again. Routes keep declaring
+    `response_model` so that the OpenAPI schema does not change.
+    """
+    media_type = "application/json"
+
+    def __init__(self, tp: Any, content: Any, **kwargs: Any) -> None:
+        super().__init__(get_adapter(tp).dump_json(content, by_alias=True), **kwargs)
@@ -1,8 +1,34 @@
+import re
+from functools import lru_cache
+
 from nh3 import clean as nh3_clean
 
+from core.config import settings
+from core.heap import register_structure
+
+# Characters NH3 may change (it strips a leading BOM); strings without any of them come back untouched
+MARKUP_CHARACTERS = re.compile("[<>&\x00\r\xa0\ufeff]")
+
+
+@lru_cache(maxsize=settings.SANITIZER_CACHE_SIZE)
+def _clean_cached(value: str) -> str:
+    return nh3_clean(value)
+
 
 def sanitize_string(value: str | None) -> str | None:
     """Sanitize a string using NH3 to prevent XSS attacks."""
     if value is None:
         return None
+    if not MARKUP_CHARACTERS.search(value):
+        return value
+    if len(value) <= settings.SANITIZER_CACHE_MAX_LENGTH:
+        return _clean_cached(value)
     return nh3_clean(value)
+
+
+register_structure("sanitizer", _clean_cached, lambda: _clean_cached.cache_info().currsize)
+
+
+def sanitizer_cache_stats() -> dict:
+    info = _clean_cached.cache_info()
+    return {"size": info.currsize, "max_size": info.maxsize, "hits": info.hits, "misses": info.misses}